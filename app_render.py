@@ -18,7 +18,6 @@ if not hasattr(werkzeug.urls, 'url_decode'):
             return cls((k, v[0] if len(v) == 1 else v) for k, v in result.items())
         
         werkzeug.urls.url_decode = url_decode
-        print("Applied url_decode patch for Werkzeug compatibility")
     except ImportError as e:
         print(f"url_decode patch failed: {e}")
         sys.exit(1)
@@ -45,33 +44,233 @@ if not hasattr(werkzeug.urls, 'url_encode'):
             return urllib_urlencode(items, doseq=True, encoding=charset)
         
         werkzeug.urls.url_encode = url_encode
-        print("Applied url_encode patch for Werkzeug compatibility")
     except ImportError as e:
         print(f"url_encode patch failed: {e}")
         sys.exit(1)
+
+# __version__がなければ作成（Flaskのテストクライアントが参照する）
+if not hasattr(werkzeug, '__version__'):
+    from importlib.metadata import version
+    werkzeug.__version__ = version('werkzeug')
         
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from flask import Flask, current_app, g, has_app_context, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from datetime import datetime, timezone, timedelta, date
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
 from werkzeug.security import generate_password_hash, check_password_hash
+from jinja2 import FileSystemBytecodeCache, Template
+from markupsafe import Markup
 import os
+import atexit
+import bisect
 import calendar  # 追加
+import collections
+import heapq
+import concurrent.futures
+import csv
+import functools
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import logging
+import logging.handlers
+import math
+import queue
+import random
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+# アプリケーションの既定設定（create_app(config) で上書きできる）
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'your-secret-key-here-debug-mode',
+    # データストアの選択（'memory': メモリ内, 'sqlite': SQLiteファイル）
+    'DATA_STORE': os.environ.get('STUDY_APP_DATA_STORE', 'memory'),
+    'SQLITE_PATH': os.environ.get('STUDY_APP_SQLITE_PATH', 'study_app.db'),
+    # リクエストの終わりに返された接続を次のリクエスト用に残しておく数（超えた分は閉じる）
+    'SQLITE_POOL_SIZE': 8,
+    # テストユーザー等の初期データを作成するか
+    'SEED_DATA': True,
+    # 描画済みHTML断片（カレンダー・記録一覧）のキャッシュの上限バイト数（0で無効）
+    'FRAGMENT_CACHE_MAX_BYTES': 32 * 1024 * 1024,
+    # 公開ページ（/shared/<id>）のHTMLキャッシュの件数上限と有効期間（秒）
+    'SHARED_PAGE_CACHE_SIZE': 1024,
+    'SHARED_PAGE_CACHE_TTL': 60,
+    # ETagに混ぜる値（Noneならアプリ本体とテンプレートの更新時刻から作る）
+    'ETAG_SALT': None,
+    # ログ: 全体のレベル、ルート（エンドポイント名）ごとのレベル、DEBUGログを残す割合
+    'LOG_LEVEL': os.environ.get('STUDY_APP_LOG_LEVEL', 'INFO'),
+    'ROUTE_LOG_LEVELS': {},
+    'LOG_DEBUG_SAMPLE_RATE': 0.1,
+    # ログの書き出しを別スレッドで行うか、書き出し先（Noneで標準エラー出力）
+    'LOG_ASYNC': True,
+    'LOG_FILE': os.environ.get('STUDY_APP_LOG_FILE'),
+    # レイテンシの計測と、/metrics の読み出しに必要なトークン（Authorization: Bearer <トークン>、Noneなら公開しない）
+    # （リバースプロキシ経由では接続元が全てループバックになるので、アドレスでは制限しない）
+    'METRICS_ENABLED': os.environ.get('STUDY_APP_METRICS', '1') != '0',
+    'METRICS_TOKEN': os.environ.get('STUDY_APP_METRICS_TOKEN'),
+    # Jinjaのバイトコードキャッシュ（Noneで無効）
+    'JINJA_BYTECODE_CACHE_DIR': os.environ.get(
+        'STUDY_APP_JINJA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jinja_cache')),
+}
+
+# ========================
+# ログ
+# ========================
+logger = logging.getLogger('study_app')
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+class DebugSampler(logging.Filter):
+    """DEBUGのログは一定の割合だけ通す（INFO以上は全て通す）"""
+    
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+class AsyncLogWriter:
+    """QueueHandler でログを積み、QueueListener のスレッドで書き出す（リクエスト処理は出力先を待たない）"""
+    
+    def __init__(self, handler):
+        self.handler = handler
+        self.queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        self.listener = None
+        self.start()
+    
+    def start(self):
+        self.listener = logging.handlers.QueueListener(self.queue_handler.queue, self.handler,
+                                                       respect_handler_level=True)
+        self.listener.start()
+    
+    def stop(self):
+        """溜まっているログを書き出してスレッドを止める"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+    
+    def restart_after_fork(self):
+        if self.listener is not None:
+            self.queue_handler.queue = queue.SimpleQueue()
+            self.start()
+
+_log_writer = None
+_route_loggers = {}
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here-debug-mode'
-# SQLAlchemy接続をコメントアウト（一時的にデータベースなし）
-# app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///study_app.db'
-# app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def _restart_log_writer_after_fork():
+    # forkされた子プロセスには書き出しスレッドが引き継がれないので、現在の書き出し先だけ作り直す
+    if _log_writer is not None:
+        _log_writer.restart_after_fork()
+
+os.register_at_fork(after_in_child=_restart_log_writer_after_fork)
+
+def configure_logging(config):
+    """設定に合わせてログの出力先・レベル・サンプリングを設定（呼ぶたびに設定し直す）"""
+    global _log_writer
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    if _log_writer is not None:
+        _log_writer.stop()
+        _log_writer = None
+    
+    if config['LOG_FILE']:
+        handler = logging.FileHandler(config['LOG_FILE'], encoding='utf-8')
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    if config['LOG_ASYNC']:
+        _log_writer = AsyncLogWriter(handler)
+        handler = _log_writer.queue_handler
+    handler.addFilter(DebugSampler(config['LOG_DEBUG_SAMPLE_RATE']))
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(config['LOG_LEVEL'])
+    
+    # ルートごとのレベル（指定のないルートは全体のレベルに従う）
+    for route_logger in _route_loggers.values():
+        route_logger.setLevel(logging.NOTSET)
+    for endpoint, level in config['ROUTE_LOG_LEVELS'].items():
+        get_route_logger(endpoint).setLevel(level)
+
+def get_route_logger(endpoint=None):
+    """ルートごとのロガー（study_app.route.<エンドポイント名>）"""
+    endpoint = endpoint or request.endpoint
+    route_logger = _route_loggers.get(endpoint)
+    if route_logger is None:
+        route_logger = _route_loggers[endpoint] = logger.getChild(f'route.{endpoint}')
+    return route_logger
+
+@atexit.register
+def _stop_log_writer():
+    if _log_writer is not None:
+        _log_writer.stop()
 
-# SQLAlchemyを一時的に無効化
-# db = SQLAlchemy(app)
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# ルート定義（create_app() で各アプリに登録する）
+_routes = []
+
+def route(rule, **options):
+    """@app.route の代わりにルートを記録するデコレータ"""
+    def decorator(view_func):
+        _routes.append((rule, options, view_func))
+        return view_func
+    return decorator
+
 # デバッグモードフラグ
 DEBUG_MODE = True
 
+# ユーザー名の大文字・小文字を区別せずに検索するか
+USERNAME_CASE_INSENSITIVE = False
+
+# パスワードハッシュの方式（'pbkdf2:sha256:600000' のように反復回数も指定できる）
+PASSWORD_HASH_METHOD = os.environ.get('STUDY_APP_PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+
+# パスワードハッシュ計算用のプロセス数と、待ち行列の上限（超えたら503で再試行を促す）
+PASSWORD_HASH_WORKERS = int(os.environ.get('STUDY_APP_PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('STUDY_APP_PASSWORD_HASH_MAX_PENDING', 16))
+PASSWORD_HASH_TIMEOUT = 10  # 秒
+
+# XP履歴としてユーザーごとにメモリに残すイベント数の上限
+XP_LEDGER_MAX_EVENTS = 1000
+
+# レベルアップ履歴の1ページあたりの件数
+LEVEL_HISTORY_PER_PAGE = 20
+
+# 記録一覧の1ページあたりの件数
+RECORDS_PER_PAGE = 50
+RECORDS_PER_PAGE_MAX = 200
+
+# 記録一覧をストリーミングで返すか（?stream=1 でも個別に有効化できる）
+RECORDS_STREAMING = False
+
+# 記録検索の1ページあたりの件数
+SEARCH_RESULTS_PER_PAGE = 20
+
+# インポートは何件ずつまとめて追加するか（XPの加算もこの単位で1回）、報告する不正な行の数
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 20
+
+# エクスポートの列と、何件ずつまとめて送信するか
+EXPORT_FIELDS = ('id', 'study_date', 'subject', 'content', 'difficulty', 'learning_time',
+                 'is_mastered', 'due_date', 'timestamp')
+EXPORT_CHUNK_ROWS = 500
+
+# 一括同期（/sync_records）で1回に受け付ける記録数と、冪等キーの最大長
+SYNC_MAX_RECORDS = 1000
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+
+# 復習スケジュール（SM-2方式）の初期値と下限
+REVIEW_INITIAL_EASE = 2.5
+REVIEW_MIN_EASE = 1.3
+
 # アバターオプション
 AVATAR_OPTIONS = {
     'default_cat': 'https://api.dicebear.com/7.x/avataaars/svg?seed=default',
@@ -90,164 +289,2006 @@ AVATAR_OPTIONS = {
 # 基本科目
 DEFAULT_SUBJECTS = ['数学', '英語', '国語', '理科', '社会', 'プログラミング']
 
+# ユーザーごとの教科リスト
+class UserSubjects:
+    """カスタム教科と非表示にした基本教科を持ち、表示用の教科リストは版数が変わるまで使い回す"""
+    __slots__ = ('custom', 'hidden', 'version', '_visible', '_visible_set', '_cached_version')
+    
+    def __init__(self, custom=()):
+        self.custom = dict.fromkeys(custom)  # 追加順を保つ集合として使う
+        self.hidden = set()
+        self.version = 0
+        self._cached_version = -1
+    
+    def _refresh(self):
+        if self._cached_version != self.version:
+            self._visible = [s for s in DEFAULT_SUBJECTS if s not in self.hidden] + list(self.custom)
+            self._visible_set = frozenset(self._visible)
+            self._cached_version = self.version
+    
+    def visible(self):
+        """表示する教科リスト（キャッシュを返すので呼び出し側で変更しないこと）"""
+        self._refresh()
+        return self._visible
+    
+    def __contains__(self, subject):
+        self._refresh()
+        return subject in self._visible_set
+
+class SlottedUserMixin:
+    """Flask-Loginが使う属性とメソッド（UserMixinは__slots__を持たず、継承すると__dict__が付くので自前で用意）"""
+    __slots__ = ()
+    
+    @property
+    def is_active(self):
+        return True
+    
+    @property
+    def is_authenticated(self):
+        return True
+    
+    @property
+    def is_anonymous(self):
+        return False
+    
+    def get_id(self):
+        return str(self.id)
+
 # ダミーユーザークラス（データベースなし）
-class DummyUser(UserMixin):
+class DummyUser(SlottedUserMixin):
+    __slots__ = ('id', 'username', 'password_hash', 'level', 'xp', 'total_xp', 'avatar', 'records_count',
+                 'created_ts')
+    
     def __init__(self, user_id, username, level=1, xp=0, avatar='default_cat'):
         self.id = user_id
         self.username = username
         self.level = level
         self.xp = xp
+        self.total_xp = total_xp_for_level(level) + xp  # これまでに獲得した累計XP
         self.avatar = avatar
         self.records_count = 0
-        self.created_at = datetime.now(timezone.utc)
+        self.created_ts = int(time.time())  # 作成日時（UNIX時刻）
+    
+    @property
+    def created_at(self):
+        return datetime.fromtimestamp(self.created_ts, timezone.utc)
     
     @property
     def xp_to_next(self):
         return self.level * 100
 
+def total_xp_for_level(level):
+    """レベル1からlevelに到達するまでに必要な累計XP（100 + 200 + ... + (level-1)*100）"""
+    return 50 * level * (level - 1)
+
+def level_for_total_xp(total_xp):
+    """累計XPから (レベル, 次のレベルまでの途中XP) を計算（ループせずに求める）"""
+    # 50 * L * (L - 1) <= total_xp を満たす最大のL
+    level = (math.isqrt(4 * (max(total_xp, 0) // 50) + 1) + 1) // 2
+    return level, total_xp - total_xp_for_level(level)
+
+def xp_for_record(learning_time, difficulty):
+    """学習記録1件で獲得できるXP"""
+    base_xp = learning_time * 0.5
+    difficulty_bonus = difficulty * 5
+    return int(base_xp + difficulty_bonus)
+
+# XP獲得履歴（追記のみ、古いイベントから捨てて一定サイズに保つ）
+class XpLedger:
+    __slots__ = ('events', 'level_ups', 'total_xp_earned', 'total_level_ups')
+    
+    def __init__(self, max_events=XP_LEDGER_MAX_EVENTS):
+        # イベントは (UNIX時刻, 獲得XP, 旧レベル, 新レベル, 理由) のタプル
+        self.events = collections.deque(maxlen=max_events)
+        self.level_ups = collections.deque(maxlen=max_events)
+        self.total_xp_earned = 0
+        self.total_level_ups = 0
+    
+    def append(self, xp, old_level, new_level, reason=""):
+        event = (int(time.time()), xp, old_level, new_level, sys.intern(reason))
+        self.events.append(event)
+        self.total_xp_earned += xp
+        if new_level > old_level:
+            self.level_ups.append(event)
+            self.total_level_ups += 1
+    
+    def level_up_page(self, offset, limit):
+        """レベルアップイベントを新しい順に取得"""
+        return list(itertools.islice(reversed(self.level_ups), offset, offset + limit))
+
+def xp_event_to_dict(event):
+    """XPイベントのタプルをテンプレート用の辞書に変換"""
+    created_at, xp, old_level, new_level, reason = event
+    return {
+        'old_level': old_level,
+        'new_level': new_level,
+        'xp_earned': xp,
+        'message': f"{reason}によりレベルアップ！" if reason else "レベルアップ！",
+        'timestamp': datetime.fromtimestamp(created_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+# これ以上の件数をまとめて集計するときだけNumPyを使う（少ない件数では読み込み時間の方が大きい）
+NUMPY_MIN_RECORDS = 10_000
+
+@functools.lru_cache(maxsize=None)
+def optional_numpy():
+    """NumPyがあれば返す（読み込みに数十msかかるので、最初に必要になったときだけ読み込む）"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def compute_subject_stats(records):
+    """学習記録から教科別の [記録数, 合計学習時間, 難易度合計, 復習済み数] をまとめて計算"""
+    subject_codes = {}
+    codes = array('q')
+    minutes = array('q')
+    difficulties = array('q')
+    mastered = array('q')
+    for record in records:
+        codes.append(subject_codes.setdefault(record.subject, len(subject_codes)))
+        minutes.append(record.learning_time)
+        difficulties.append(record.difficulty)
+        mastered.append(1 if record.is_mastered else 0)
+    
+    n_subjects = len(subject_codes)
+    np = optional_numpy() if len(codes) >= NUMPY_MIN_RECORDS else None
+    if np is not None:
+        # 教科コードごとにまとめて合計（ベクトル化）
+        code_array = np.frombuffer(codes, dtype=np.int64)
+        columns = [np.bincount(code_array, minlength=n_subjects)]
+        for values in (minutes, difficulties, mastered):
+            columns.append(np.bincount(code_array, weights=np.frombuffer(values, dtype=np.int64),
+                                       minlength=n_subjects))
+        totals = [[int(column[code]) for column in columns] for code in range(n_subjects)]
+    else:
+        totals = [[0, 0, 0, 0] for _ in range(n_subjects)]
+        for code, minute, difficulty, is_mastered in zip(codes, minutes, difficulties, mastered):
+            stats = totals[code]
+            stats[0] += 1
+            stats[1] += minute
+            stats[2] += difficulty
+            stats[3] += is_mastered
+    
+    return {subject: totals[code] for subject, code in subject_codes.items()}
+
+def subject_stats_to_list(stats):
+    """教科別集計を表示用の辞書リストに変換（学習時間の多い順）"""
+    result = []
+    for subject, (record_count, total_minutes, difficulty_sum, mastered_count) in stats.items():
+        if record_count <= 0:
+            continue
+        result.append({
+            'subject': subject,
+            'record_count': record_count,
+            'total_minutes': total_minutes,
+            'average_difficulty': round(difficulty_sum / record_count, 1),
+            'mastery_ratio': round(mastered_count / record_count, 3),
+        })
+    result.sort(key=lambda item: item['total_minutes'], reverse=True)
+    return result
+
+def streak_runs_from_days(days):
+    """昇順の日付序数から、連続して学習した期間 (開始, 終了) を列挙"""
+    start = end = None
+    for day in days:
+        if end is not None and day == end + 1:
+            end = day
+            continue
+        if start is not None:
+            yield start, end
+        start = end = day
+    if start is not None:
+        yield start, end
+
+# 連続学習日数（ストリーク）の追跡
+class StreakTracker:
+    """学習した日の連続期間を保持し、日の追加・削除のたびに期間を結合・分割する"""
+    __slots__ = ('start_of_end', 'end_of_start', 'starts', 'length_counts', 'length_heap')
+    
+    def __init__(self):
+        self.start_of_end = {}  # 期間の終了日 -> 開始日
+        self.end_of_start = {}  # 期間の開始日 -> 終了日
+        self.starts = []  # 期間の開始日（昇順）
+        self.length_counts = {}  # 期間の長さ -> その長さの期間の数
+        self.length_heap = []  # 期間の長さ（符号反転した最大ヒープ、古い値は読み出し時に捨てる）
+    
+    def _add_run(self, start, end):
+        self.start_of_end[end] = start
+        self.end_of_start[start] = end
+        bisect.insort(self.starts, start)
+        length = end - start + 1
+        count = self.length_counts.get(length, 0)
+        self.length_counts[length] = count + 1
+        if count == 0:
+            heapq.heappush(self.length_heap, -length)
+    
+    def _remove_run(self, start, end):
+        del self.start_of_end[end]
+        del self.end_of_start[start]
+        del self.starts[bisect.bisect_left(self.starts, start)]
+        length = end - start + 1
+        self.length_counts[length] -= 1
+        if self.length_counts[length] == 0:
+            del self.length_counts[length]
+    
+    def _run_containing(self, day):
+        i = bisect.bisect_right(self.starts, day) - 1
+        if i < 0:
+            return None
+        start = self.starts[i]
+        end = self.end_of_start[start]
+        return (start, end) if day <= end else None
+    
+    def add_day(self, day):
+        """学習した日を追加（前後の期間とつなげる）"""
+        start = end = day
+        left_start = self.start_of_end.get(day - 1)
+        if left_start is not None:
+            self._remove_run(left_start, day - 1)
+            start = left_start
+        right_end = self.end_of_start.get(day + 1)
+        if right_end is not None:
+            self._remove_run(day + 1, right_end)
+            end = right_end
+        self._add_run(start, end)
+    
+    def remove_day(self, day):
+        """学習した日を削除（期間を前後に分割）"""
+        run = self._run_containing(day)
+        if run is None:
+            return
+        start, end = run
+        self._remove_run(start, end)
+        if start < day:
+            self._add_run(start, day - 1)
+        if day < end:
+            self._add_run(day + 1, end)
+    
+    def longest(self):
+        while self.length_heap and -self.length_heap[0] not in self.length_counts:
+            heapq.heappop(self.length_heap)
+        return -self.length_heap[0] if self.length_heap else 0
+    
+    def current(self, today):
+        """今日（今日がまだなら昨日）まで続いている連続日数"""
+        today = today.toordinal()
+        run = self._run_containing(today)
+        if run is not None:
+            return today - run[0] + 1
+        start = self.start_of_end.get(today - 1)
+        return today - start if start is not None else 0
+
+def _normalize_search_text(text):
+    return unicodedata.normalize('NFKC', text).casefold().split()
+
+def index_terms(text):
+    """索引に登録する語（各文字と文字バイグラム）と出現回数"""
+    terms = collections.Counter()
+    for chunk in _normalize_search_text(text):
+        terms.update(chunk)
+        terms.update(chunk[i:i + 2] for i in range(len(chunk) - 1))
+    return terms
+
+def query_terms(query):
+    """検索語を文字バイグラムに分割（1文字の語はそのまま、形態素解析なしで日本語にも対応）"""
+    terms = set()
+    for chunk in _normalize_search_text(query):
+        if len(chunk) == 1:
+            terms.add(chunk)
+        else:
+            terms.update(chunk[i:i + 2] for i in range(len(chunk) - 1))
+    return terms
+
+def record_search_text(subject, content):
+    return f"{subject} {content}"
+
+def rank_search_hits(postings, n_docs, offset, limit):
+    """全ての語を含む記録をTF-IDFの合計で順位付けし、(記録IDのページ, 該当件数) を返す"""
+    if not postings:
+        return [], 0
+    # 最も短い転置リストから候補を絞る
+    lists = sorted(postings.values(), key=len)
+    hits = [record_id for record_id in lists[0] if all(record_id in docs for docs in lists[1:])]
+    weights = [(math.log(1 + n_docs / len(docs)), docs) for docs in lists]
+    scored = ((sum(idf * docs[record_id] for idf, docs in weights), record_id) for record_id in hits)
+    # 同点なら新しい記録（IDが大きい方）を先に
+    top = heapq.nlargest(offset + limit, scored)
+    return [record_id for _, record_id in top[offset:]], len(hits)
+
+# 記録の全文検索用の転置インデックス
+class SearchIndex:
+    """語 -> {記録ID: 出現回数} を保持し、記録の追加・削除のたびに更新する"""
+    __slots__ = ('postings',)
+    
+    def __init__(self):
+        self.postings = {}
+    
+    def add(self, record_id, text):
+        for term, count in index_terms(text).items():
+            self.postings.setdefault(term, {})[record_id] = count
+    
+    def remove(self, record_id, text):
+        for term in index_terms(text):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(record_id, None)
+            if not docs:
+                del self.postings[term]
+    
+    def search(self, query, n_docs, offset, limit):
+        postings = {}
+        for term in query_terms(query):
+            docs = self.postings.get(term)
+            if docs is None:
+                return [], 0
+            postings[term] = docs
+        return rank_search_hits(postings, n_docs, offset, limit)
+
+# ========================
+# 復習スケジュール（SM-2方式）
+# ========================
+def review_quality(difficulty):
+    """難易度(1〜5)をSM-2の回答品質(5〜1)に変換（難しいほど品質が低い）"""
+    return 6 - max(1, min(5, difficulty))
+
+def next_review_ease(ease, difficulty):
+    q = 5 - review_quality(difficulty)
+    return max(REVIEW_MIN_EASE, ease + 0.1 - q * (0.08 + q * 0.02))
+
+def schedule_review(record, today):
+    """復習完了として次の復習日を決める（間隔は1日、6日、以降は前回の間隔×易しさ）"""
+    record.review_count += 1
+    if record.review_count == 1:
+        record.review_interval = 1
+    elif record.review_count == 2:
+        record.review_interval = 6
+    else:
+        record.review_interval = round(record.review_interval * record.review_ease)
+    record.review_ease = next_review_ease(record.review_ease, record.difficulty)
+    record.due_day = today.toordinal() + record.review_interval
+
+def reset_review(record, today):
+    """未復習に戻したとき（忘れたとき）は間隔を最初からやり直し、今日を期限にする"""
+    record.review_count = 0
+    record.review_interval = 1
+    record.review_ease = max(REVIEW_MIN_EASE, record.review_ease - 0.2)
+    record.due_day = today.toordinal()
+
+def review_key(record):
+    """復習キューの並び順（期限が早い順、同じ日なら難しい順）"""
+    return record.due_day, -record.difficulty, record.id
+
+# 未復習の記録を復習期限順に保持するキュー
+class ReviewQueue:
+    """記録IDごとに現在のキーを持ち、ヒープ上の古いエントリは読み出し時に捨てる"""
+    __slots__ = ('heap', 'keys')
+    
+    def __init__(self):
+        self.heap = []
+        self.keys = {}  # record_id -> review_key
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def push(self, record):
+        key = review_key(record)
+        if self.keys.get(record.id) == key:
+            return
+        self.keys[record.id] = key
+        heapq.heappush(self.heap, key)
+    
+    def discard(self, record_id):
+        self.keys.pop(record_id, None)
+        # 古いエントリが溜まりすぎたら作り直す
+        if len(self.heap) > 2 * len(self.keys) + 64:
+            self.heap = list(self.keys.values())
+            heapq.heapify(self.heap)
+    
+    def next_due(self, k):
+        """期限が早い順にk件の記録IDを返す（O(k log n)）"""
+        taken = []
+        while self.heap and len(taken) < k:
+            key = heapq.heappop(self.heap)
+            # 捨てた記録を同じキーで入れ直すと有効なエントリが2つ残るので、2つ目は捨てる
+            if self.keys.get(key[2]) == key and (not taken or taken[-1] != key):
+                taken.append(key)
+        for key in taken:
+            heapq.heappush(self.heap, key)
+        return [key[2] for key in taken]
+
 # ダミーレコードクラス
 class DummyRecord:
-    def __init__(self, record_id, subject, content, difficulty=3, learning_time=30):
+    """日付は序数、日時はUNIX時刻の整数で持ち、文字列への整形は表示するときだけ行う"""
+    __slots__ = ('id', 'subject', 'content', 'difficulty', 'learning_time', 'study_day', 'created_ts',
+                 'is_mastered', 'mastered_ts', 'review_count', 'review_interval', 'review_ease', 'due_day')
+    
+    def __init__(self, record_id, subject, content, difficulty=3, learning_time=30, study_date=None):
         self.id = record_id
         self.subject = subject
         self.content = content
         self.difficulty = difficulty
         self.learning_time = learning_time
-        self.study_date = date.today().strftime('%Y-%m-%d')
-        self.timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self.study_day = (study_date or date.today()).toordinal()
+        self.created_ts = int(time.time())
         self.is_mastered = False
-        self.mastered_at = None
+        self.mastered_ts = None
+        # 復習スケジュール（学習した翌日が最初の期限）
+        self.review_count = 0
+        self.review_interval = 1
+        self.review_ease = REVIEW_INITIAL_EASE
+        self.due_day = self.study_day + 1
+    
+    @property
+    def study_date(self):
+        return date.fromordinal(self.study_day).strftime('%Y-%m-%d')
+    
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(self.created_ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    
+    @property
+    def mastered_at(self):
+        return datetime.fromtimestamp(self.mastered_ts, timezone.utc) if self.mastered_ts is not None else None
+    
+    @property
+    def due_date(self):
+        return date.fromordinal(self.due_day).strftime('%Y-%m-%d')
 
 # ダミーデータストア
 class DummyDataStore:
-    def __init__(self):
+    def __init__(self, seed=True):
         self.users = {}
-        self.records = {}
-        self.subjects = {}  # 教科データを追加
+        self.username_index = {}  # 正規化ユーザー名 -> ユーザー
+        self.username_index_ci = {}  # 大文字小文字を無視したユーザー名 -> [ユーザー, ...]
+        self.records = {}  # user_id -> [record, ...]（学習日・ID順に整列）
+        self.record_keys = {}  # user_id -> [(学習日の序数, record_id), ...]（recordsと同じ並び）
+        self.subject_names = {}  # user_id -> {教科: 教科}（同じ教科名は1つの文字列を共有）
+        self.record_index = {}  # user_id -> {record_id: record}
+        self.record_owners = {}  # record_id -> user_id（全ユーザー共通の記録ID索引）
+        self.daily_activity = {}  # user_id -> {学習日の序数: [記録数, 合計学習時間(分)]}
+        self.xp_ledgers = {}  # user_id -> XpLedger
+        self.subject_stats = {}  # user_id -> {教科: [記録数, 合計学習時間, 難易度合計, 復習済み数]}
+        self.streaks = {}  # user_id -> StreakTracker
+        self.search_indexes = {}  # user_id -> SearchIndex
+        self.review_queues = {}  # user_id -> ReviewQueue（未復習の記録）
+        self.scheduled_reviews = {}  # user_id -> ReviewQueue（復習済みで次の復習期限を待つ記録）
+        self.subjects = {}  # user_id -> UserSubjects（ユーザー作成時に用意）
+        self.data_versions = {}  # user_id -> (ユーザーのデータを変更するたびに増える版数, 最終更新のUNIX時刻)
+        self.idempotency_keys = {}  # user_id -> {クライアントが付けた冪等キー: record_id}
         self.next_user_id = 1
         self.next_record_id = 1
         
-        # デフォルトテストユーザー
-        self.add_user('test', 'test123', level=5, xp=350, avatar='cat')
-        self.add_user('admin', 'debug123', level=1, xp=0, avatar='default_cat')
+        if seed:
+            self.seed_default_data()
+    
+    def seed_default_data(self):
+        """デフォルトテストユーザーと教科データを作成"""
+        test_user = self.add_user('test', 'test123', level=5, xp=350, avatar='cat')
+        admin_user = self.add_user('admin', 'debug123', level=1, xp=0, avatar='default_cat')
         
         # 教科データを初期化
-        self.subjects = {
-            # user_id: [subject1, subject2, ...]
-            1: ['物理', '化学', '歴史'],  # テストユーザー
-            2: [],  # 管理者（カスタム教科なし）
-        }
+        self.subjects.update({
+            test_user.id: UserSubjects(['物理', '化学', '歴史']),  # テストユーザー
+            admin_user.id: UserSubjects(),  # 管理者（カスタム教科なし）
+        })
     
-    def add_user(self, username, password, level=1, xp=0, avatar='default_cat'):
+    def add_user(self, username, password=None, level=1, xp=0, avatar='default_cat', password_hash=None):
+        """ユーザーを追加（ハッシュ計算済みなら password_hash を渡す）"""
         user_id = self.next_user_id
         self.next_user_id += 1
         user = DummyUser(user_id, username, level, xp, avatar)
-        user.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        user.password_hash = password_hash or generate_password_hash(password, method=PASSWORD_HASH_METHOD)
         self.users[user_id] = user
-        self.users[username] = user  # ユーザー名でも検索可能に
+        self.subjects[user_id] = UserSubjects()
+        self._index_username(user)  # ユーザー名でも検索可能に
         return user
     
-    def get_user_by_username(self, username):
-        for user in self.users.values():
-            if hasattr(user, 'username') and user.username == username:
-                return user
-        return None
+    @staticmethod
+    def normalize_username(username, case_insensitive=False):
+        """ユーザー名を索引用に正規化（全角・半角の揺れと前後の空白を吸収）"""
+        key = unicodedata.normalize('NFKC', username or '').strip()
+        return key.casefold() if case_insensitive else key
+    
+    def _index_username(self, user):
+        """ユーザー名索引に登録（同名が既にあれば先に登録されたユーザーを優先）"""
+        self.username_index.setdefault(self.normalize_username(user.username), user)
+        ci_key = self.normalize_username(user.username, case_insensitive=True)
+        self.username_index_ci.setdefault(ci_key, []).append(user)
+    
+    def _unindex_username(self, user):
+        """ユーザー名索引から削除"""
+        key = self.normalize_username(user.username)
+        if self.username_index.get(key) is user:
+            del self.username_index[key]
+        ci_key = self.normalize_username(user.username, case_insensitive=True)
+        bucket = self.username_index_ci.get(ci_key)
+        if bucket and user in bucket:
+            bucket.remove(user)
+            if not bucket:
+                del self.username_index_ci[ci_key]
+    
+    def get_user_by_username(self, username, case_insensitive=False):
+        """ユーザー名からユーザーを取得（索引を使うのでO(1)）"""
+        if case_insensitive:
+            bucket = self.username_index_ci.get(self.normalize_username(username, case_insensitive=True))
+            return bucket[0] if bucket else None
+        return self.username_index.get(self.normalize_username(username))
+    
+    def rename_user(self, user_id, new_username):
+        """ユーザー名を変更し、索引も更新"""
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        self._unindex_username(user)
+        user.username = new_username
+        self._index_username(user)
+        self._bump_data_version(user_id)
+        return user
     
     def get_user_by_id(self, user_id):
         return self.users.get(user_id)
     
-    def get_user_subjects(self, user_id):
-        """ユーザーの教科リストを取得"""
-        # 非表示リストから除外する基本教科を取得
-        hidden = []
-        if hasattr(self, 'hidden_subjects') and user_id in self.hidden_subjects:
-            hidden = self.hidden_subjects[user_id]
-        
-        # 非表示でない基本教科だけをフィルタリング
-        visible_basic_subjects = [s for s in DEFAULT_SUBJECTS if s not in hidden]
-        
-        # ユーザーのカスタム教科を追加
-        custom_subjects = self.subjects.get(user_id, [])
+    def save_user(self, user):
+        """ユーザー情報（レベル・XP・アバター等）の変更を保存（メモリ内では版数を上げるだけ）"""
+        self._bump_data_version(user.id)
+        return user
+    
+    def set_password_hash(self, user_id, password_hash):
+        user = self.users.get(user_id)
+        if user is not None:
+            user.password_hash = password_hash
+    
+    def add_user_xp(self, user_id, xp_to_add, reason=""):
+        """XPを加算してレベルを更新し、(旧レベル, 新レベル, XP) を返す"""
+        user = self.users[user_id]
+        old_level = user.level
+        user.total_xp += xp_to_add
+        user.level, user.xp = level_for_total_xp(user.total_xp)
         
-        return visible_basic_subjects + custom_subjects
+        # XP履歴に追記
+        ledger = self.xp_ledgers.get(user_id)
+        if ledger is None:
+            ledger = self.xp_ledgers[user_id] = XpLedger()
+        ledger.append(xp_to_add, old_level, user.level, reason)
+        self._bump_data_version(user_id)
+        return old_level, user.level, user.xp
+    
+    def get_xp_stats(self, user_id):
+        """(レベルアップ回数, 総獲得XP) を取得"""
+        ledger = self.xp_ledgers.get(user_id)
+        if ledger is None:
+            return 0, 0
+        return ledger.total_level_ups, ledger.total_xp_earned
+    
+    def get_level_history(self, user_id, offset=0, limit=LEVEL_HISTORY_PER_PAGE):
+        """レベルアップ履歴を新しい順に取得し、(イベント, 保持している件数) を返す"""
+        ledger = self.xp_ledgers.get(user_id)
+        if ledger is None:
+            return [], 0
+        return ledger.level_up_page(offset, limit), len(ledger.level_ups)
+    
+    def get_data_version(self, user_id):
+        """ユーザーのデータ（記録・教科・XP・プロフィール）の版数（キャッシュキーやETagに使う）"""
+        return self.get_data_state(user_id)[0]
+    
+    def get_data_state(self, user_id):
+        """(版数, 最終更新のUNIX時刻) を取得（一度も変更がなければユーザーの作成時刻）"""
+        state = self.data_versions.get(user_id)
+        if state is None:
+            user = self.users.get(user_id)
+            return 0, user.created_ts if user is not None else 0
+        return state
+    
+    def _bump_data_version(self, user_id):
+        version = self.data_versions.get(user_id, (0, 0))[0]
+        self.data_versions[user_id] = (version + 1, int(time.time()))
+    
+    def _user_subjects(self, user_id):
+        subjects = self.subjects.get(user_id)
+        if subjects is None:
+            subjects = self.subjects[user_id] = UserSubjects()
+        return subjects
+    
+    def get_user_subjects(self, user_id):
+        """ユーザーの教科リストを取得（教科が変わるまでキャッシュを返す）"""
+        return self._user_subjects(user_id).visible()
+    
+    def has_user_subject(self, user_id, subject):
+        """教科がユーザーの教科リストにあるか（O(1)）"""
+        return subject in self._user_subjects(user_id)
+    
+    def get_subjects_version(self, user_id):
+        """教科リストの版数（追加・削除・復元のたびに増える）"""
+        return self._user_subjects(user_id).version
     
     def add_user_subject(self, user_id, subject):
         """ユーザーに新しい教科を追加"""
-        if user_id not in self.subjects:
-            self.subjects[user_id] = []
+        subjects = self._user_subjects(user_id)
         
         # 重複チェック
-        if subject in self.get_user_subjects(user_id):
+        if subject in subjects:
             return False
         
-        # 現在のカスタム教科数を取得（基本教科は含めない）
-        current_custom_count = len(self.subjects.get(user_id, []))
-        
         # カスタム教科の最大数は10個（基本教科とは別）
-        if current_custom_count >= 10:
+        if len(subjects.custom) >= 10:
             return False
         
-        self.subjects[user_id].append(subject)
+        subjects.custom[subject] = None
+        subjects.version += 1
+        self._bump_data_version(user_id)
         return True
     
     def delete_user_subject(self, user_id, subject):
         """ユーザーから教科を削除"""
-        # 現在の教科リストを取得
-        current_subjects = self.get_user_subjects(user_id)
+        subjects = self._user_subjects(user_id)
         
         # 教科が1つしかない場合は削除不可
-        if len(current_subjects) <= 1:
+        if len(subjects.visible()) <= 1:
             return False
         
-        # 基本教科でも削除可能にするが、最低1つの教科は残す
-        if user_id in self.subjects:
-            # カスタム教科の場合
-            if subject in self.subjects[user_id]:
-                self.subjects[user_id].remove(subject)
-                return True
-            # 基本教科の場合（デフォルトリストから削除するのではなく、ユーザーの非表示リストに追加）
-            elif subject in DEFAULT_SUBJECTS:
-                # 非表示リストを作成（初めての場合）
-                if not hasattr(self, 'hidden_subjects'):
-                    self.hidden_subjects = {}
-                if user_id not in self.hidden_subjects:
-                    self.hidden_subjects[user_id] = []
-                # 基本教科を非表示リストに追加
-                if subject not in self.hidden_subjects[user_id]:
-                    self.hidden_subjects[user_id].append(subject)
-                return True
-        return False
+        # カスタム教科の場合
+        if subject in subjects.custom:
+            del subjects.custom[subject]
+        # 基本教科の場合（デフォルトリストから削除するのではなく、ユーザーの非表示リストに追加）
+        elif subject in DEFAULT_SUBJECTS:
+            subjects.hidden.add(subject)
+        else:
+            return False
+        subjects.version += 1
+        self._bump_data_version(user_id)
+        return True
+    
+    def count_custom_subjects(self, user_id):
+        """カスタム教科の数（基本教科は含めない）"""
+        return len(self._user_subjects(user_id).custom)
+    
+    def restore_user_subject(self, user_id, subject):
+        """非表示にした基本教科を復元"""
+        subjects = self._user_subjects(user_id)
+        if subject not in subjects.hidden:
+            return False
+        subjects.hidden.remove(subject)
+        subjects.version += 1
+        self._bump_data_version(user_id)
+        return True
     
-    def add_record(self, user_id, subject, content, difficulty=3, learning_time=30):
+    def add_record(self, user_id, subject, content, difficulty=3, learning_time=30, study_date=None):
         record_id = self.next_record_id
         self.next_record_id += 1
-        record = DummyRecord(record_id, subject, content, difficulty, learning_time)
+        subject = self.subject_names.setdefault(user_id, {}).setdefault(subject, subject)
+        record = DummyRecord(record_id, subject, content, difficulty, learning_time, study_date)
         
         if user_id not in self.records:
             self.records[user_id] = []
-        self.records[user_id].append(record)
+            self.record_keys[user_id] = []
+            self.record_index[user_id] = {}
+        # 学習日順を保ったまま挿入（今日の記録はほぼ末尾への追加になる）
+        key = (record.study_day, record_id)
+        keys = self.record_keys[user_id]
+        pos = bisect.bisect_right(keys, key)
+        keys.insert(pos, key)
+        self.records[user_id].insert(pos, record)
+        self.record_index[user_id][record_id] = record
+        self.record_owners[record_id] = user_id
+        self._update_daily_activity(user_id, record, 1)
+        self._update_subject_stats(user_id, record, 1)
+        self.search_indexes.setdefault(user_id, SearchIndex()).add(
+            record_id, record_search_text(record.subject, record.content))
+        self.review_queues.setdefault(user_id, ReviewQueue()).push(record)
+        self._bump_data_version(user_id)
         return record
     
+    def add_records(self, user_id, rows):
+        """(教科, 内容, 難易度, 学習時間, 学習日) の列をまとめて追加（並びの更新と版数の更新は1回だけ）"""
+        names = self.subject_names.setdefault(user_id, {})
+        new_records = []
+        for subject, content, difficulty, learning_time, study_date in rows:
+            new_records.append(DummyRecord(self.next_record_id, names.setdefault(subject, subject), content,
+                                           difficulty, learning_time, study_date))
+            self.next_record_id += 1
+        if not new_records:
+            return []
+        
+        if user_id not in self.records:
+            self.records[user_id] = []
+            self.record_keys[user_id] = []
+            self.record_index[user_id] = {}
+        keys = self.record_keys[user_id]
+        user_records = self.records[user_id]
+        batch = sorted(((record.study_day, record.id), record) for record in new_records)
+        if not keys or batch[0][0] > keys[-1]:
+            # 既存の記録より新しい日付だけなら末尾に足すだけ
+            keys.extend(key for key, _ in batch)
+            user_records.extend(record for _, record in batch)
+        else:
+            # 1件ずつ挿入すると件数の2乗になるので、整列済みの2列を1回でマージする
+            merged = list(heapq.merge(zip(keys, user_records), batch))
+            keys[:] = [key for key, _ in merged]
+            user_records[:] = [record for _, record in merged]
+        
+        index = self.record_index[user_id]
+        search_index = self.search_indexes.setdefault(user_id, SearchIndex())
+        queue = self.review_queues.setdefault(user_id, ReviewQueue())
+        for record in new_records:
+            index[record.id] = record
+            self.record_owners[record.id] = user_id
+            self._update_daily_activity(user_id, record, 1)
+            search_index.add(record.id, record_search_text(record.subject, record.content))
+            queue.push(record)
+        # 教科別集計は追加分だけまとめて計算して足し込む
+        subjects = self.subject_stats.setdefault(user_id, {})
+        for subject, totals in compute_subject_stats(new_records).items():
+            stats = subjects.setdefault(subject, [0, 0, 0, 0])
+            for i, value in enumerate(totals):
+                stats[i] += value
+        self._bump_data_version(user_id)
+        return new_records
+    
+    def sync_records(self, user_id, keyed_rows, reason=""):
+        """冪等キーつきの (キー, 行) の列のうち未適用のものだけを追加し、XPもまとめて加算
+        
+        戻り値は ({キー: 追加した記録}, {適用済みだったキー: record_id}, (旧レベル, 新レベル, XP))
+        """
+        applied = self.idempotency_keys.setdefault(user_id, {})
+        new_keys, new_rows, seen = [], [], set()
+        for key, row in keyed_rows:
+            if key not in applied and key not in seen:
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(row)
+        duplicates = {key: applied[key] for key, _ in keyed_rows if key in applied}
+        
+        created = dict(zip(new_keys, self.add_records(user_id, new_rows)))
+        for key, record in created.items():
+            applied[key] = record.id
+        
+        user = self.users[user_id]
+        xp = sum(xp_for_record(record.learning_time, record.difficulty) for record in created.values())
+        level_state = self.add_user_xp(user_id, xp, reason) if xp else (user.level, user.level, user.xp)
+        user.records_count = self.count_user_records(user_id)
+        return created, duplicates, level_state
+    
+    def _update_subject_stats(self, user_id, record, sign):
+        """教科別集計を増減（sign=1で追加、-1で削除）"""
+        subjects = self.subject_stats.setdefault(user_id, {})
+        stats = subjects.setdefault(record.subject, [0, 0, 0, 0])
+        stats[0] += sign
+        stats[1] += sign * record.learning_time
+        stats[2] += sign * record.difficulty
+        if record.is_mastered:
+            stats[3] += sign
+        if stats[0] <= 0:
+            del subjects[record.subject]
+    
+    def get_subject_stats(self, user_id):
+        """教科別の学習状況を取得（教科数に比例する時間で済む）"""
+        return subject_stats_to_list(self.subject_stats.get(user_id, {}))
+    
+    def rebuild_subject_stats(self, user_id):
+        """教科別集計を全記録から作り直す（一括インポート後など）"""
+        self.subject_stats[user_id] = compute_subject_stats(self.records.get(user_id, []))
+    
+    def _update_daily_activity(self, user_id, record, sign):
+        """日別の記録数・学習時間を増減（sign=1で追加、-1で削除）"""
+        ordinal = record.study_day
+        days = self.daily_activity.setdefault(user_id, {})
+        stats = days.setdefault(ordinal, [0, 0])
+        stats[0] += sign
+        stats[1] += sign * record.learning_time
+        # 学習した日が増えた・なくなったときだけ連続日数を更新
+        if stats[0] == 1 and sign > 0:
+            self.streaks.setdefault(user_id, StreakTracker()).add_day(ordinal)
+        if stats[0] <= 0:
+            del days[ordinal]
+            self.streaks[user_id].remove_day(ordinal)
+    
+    def get_streaks(self, user_id, today=None):
+        """(現在の連続学習日数, 最長の連続学習日数) を取得"""
+        tracker = self.streaks.get(user_id)
+        if tracker is None:
+            return 0, 0
+        return tracker.current(today or date.today()), tracker.longest()
+    
+    def get_daily_activity(self, user_id, day):
+        """指定日の (記録数, 合計学習時間) を取得"""
+        stats = self.daily_activity.get(user_id, {}).get(day.toordinal())
+        return (stats[0], stats[1]) if stats else (0, 0)
+    
+    def get_daily_activity_range(self, user_id, start, end):
+        """start〜end（両端を含む）に学習した日の {日付序数: (記録数, 合計学習時間)} を取得"""
+        days = self.daily_activity.get(user_id, {})
+        first, last = start.toordinal(), end.toordinal()
+        if last - first + 1 < len(days):
+            ordinals = (day for day in range(first, last + 1) if day in days)
+        else:
+            ordinals = (day for day in days if first <= day <= last)
+        return {day: (days[day][0], days[day][1]) for day in ordinals}
+    
     def get_user_records(self, user_id):
+        """ユーザーの記録を学習日の古い順で取得"""
         return self.records.get(user_id, [])
     
+    def count_user_records(self, user_id):
+        return len(self.records.get(user_id, []))
+    
+    def get_records_page(self, user_id, cursor=None, limit=RECORDS_PER_PAGE):
+        """(study_date, id) のキーセットで、cursorより古い記録を新しい順にlimit件取得
+        
+        戻り値は (記録リスト, 次ページのカーソル or None)
+        """
+        keys = self.record_keys.get(user_id, [])
+        user_records = self.records.get(user_id, [])
+        if cursor is None:
+            end = len(keys)
+        else:
+            end = bisect.bisect_left(keys, (date.fromisoformat(cursor[0]).toordinal(), cursor[1]))
+        start = max(0, end - limit)
+        page = user_records[start:end]
+        page.reverse()
+        next_cursor = (user_records[start].study_date, user_records[start].id) if start > 0 else None
+        return page, next_cursor
+    
+    def iter_newest_records(self, user_id, limit=None):
+        """学習日の新しい順に記録を返すイテレータ（limit件で打ち切り）"""
+        user_records = self.records.get(user_id, [])
+        newest = reversed(user_records)
+        if limit is not None:
+            newest = itertools.islice(newest, limit)
+        return newest
+    
+    def get_record(self, user_id, record_id):
+        """記録IDから記録を取得（索引を使うのでO(1)）"""
+        return self.record_index.get(user_id, {}).get(record_id)
+    
+    def get_record_owner(self, record_id):
+        """記録IDから持ち主のuser_idを取得（公開ページ用、なければNone）"""
+        return self.record_owners.get(record_id)
+    
     def delete_record(self, user_id, record_id):
-        if user_id in self.records:
-            self.records[user_id] = [r for r in self.records[user_id] if r.id != record_id]
-            return True
-        return False
+        record = self.record_index.get(user_id, {}).pop(record_id, None)
+        if record is None:
+            return False
+        del self.record_owners[record_id]
+        # リストを作り直さずにその場で削除（位置は二分探索で特定）
+        keys = self.record_keys[user_id]
+        pos = bisect.bisect_left(keys, (record.study_day, record.id))
+        del keys[pos]
+        del self.records[user_id][pos]
+        self._update_daily_activity(user_id, record, -1)
+        self._update_subject_stats(user_id, record, -1)
+        self.search_indexes[user_id].remove(record.id, record_search_text(record.subject, record.content))
+        self.review_queues[user_id].discard(record.id)
+        if user_id in self.scheduled_reviews:
+            self.scheduled_reviews[user_id].discard(record.id)
+        self._bump_data_version(user_id)
+        return True
+    
+    def search_records(self, user_id, query, offset=0, limit=SEARCH_RESULTS_PER_PAGE):
+        """内容と教科を全文検索し、(関連度順の記録のページ, 該当件数) を返す"""
+        index = self.search_indexes.get(user_id)
+        if index is None:
+            return [], 0
+        record_index = self.record_index[user_id]
+        record_ids, total = index.search(query, len(record_index), offset, limit)
+        return [record_index[record_id] for record_id in record_ids], total
     
     def toggle_mastery(self, user_id, record_id):
-        if user_id in self.records:
-            for record in self.records[user_id]:
-                if record.id == record_id:
-                    record.is_mastered = not record.is_mastered
-                    record.mastered_at = datetime.now(timezone.utc) if record.is_mastered else None
-                    return record
-        return None
+        record = self.get_record(user_id, record_id)
+        if record is None:
+            return None
+        record.is_mastered = not record.is_mastered
+        record.mastered_ts = int(time.time()) if record.is_mastered else None
+        self.subject_stats[user_id][record.subject][3] += 1 if record.is_mastered else -1
+        queue = self.review_queues[user_id]
+        scheduled = self.scheduled_reviews.setdefault(user_id, ReviewQueue())
+        if record.is_mastered:
+            schedule_review(record, date.today())
+            queue.discard(record_id)
+            scheduled.push(record)
+        else:
+            reset_review(record, date.today())
+            scheduled.discard(record_id)
+            queue.push(record)
+        self._bump_data_version(user_id)
+        return record
+    
+    def complete_review(self, user_id, record_id, today=None):
+        """復習完了を記録（未復習なら復習済みにし、復習済みで期限が来ていれば次の期限を決め直す）
+        
+        記録がないか、復習済みでまだ期限前なら None を返す
+        """
+        today = today or date.today()
+        record = self.get_record(user_id, record_id)
+        if record is None:
+            return None
+        if not record.is_mastered:
+            return self.toggle_mastery(user_id, record_id)
+        if record.due_day > today.toordinal():
+            return None
+        schedule_review(record, today)
+        self.scheduled_reviews[user_id].push(record)
+        self._bump_data_version(user_id)
+        return record
+    
+    def get_due_reviews(self, user_id, limit, today=None):
+        """未復習の記録と、復習済みで期限が来た記録を、復習期限が早い順にlimit件取得"""
+        today = (today or date.today()).toordinal()
+        record_index = self.record_index.get(user_id, {})
+        due = []
+        queue = self.review_queues.get(user_id)
+        if queue is not None:
+            due.extend(record_index[record_id] for record_id in queue.next_due(limit))
+        scheduled = self.scheduled_reviews.get(user_id)
+        if scheduled is not None:
+            # 期限順に並んでいるので、期限前の記録が出てきたらそれ以降も期限前
+            for record_id in scheduled.next_due(limit):
+                record = record_index[record_id]
+                if record.due_day > today:
+                    break
+                due.append(record)
+        return heapq.nsmallest(limit, due, key=review_key)
+    
+    def count_unmastered_records(self, user_id):
+        queue = self.review_queues.get(user_id)
+        return len(queue) if queue is not None else 0
+    
+    def release_connection(self):
+        """SQLite版と同じ呼び出しに合わせたもの（メモリ内なので返す接続はない）"""
 
-# グローバルデータストア
-dummy_store = DummyDataStore()
+# SQLiteデータストア（DummyDataStoreと同じメソッドを提供）
+class SqliteDataStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            username_key TEXT NOT NULL,
+            username_ci TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            level INTEGER NOT NULL DEFAULT 1,
+            xp INTEGER NOT NULL DEFAULT 0,
+            total_xp INTEGER NOT NULL DEFAULT 0,
+            total_xp_earned INTEGER NOT NULL DEFAULT 0,
+            total_level_ups INTEGER NOT NULL DEFAULT 0,
+            subjects_version INTEGER NOT NULL DEFAULT 0,
+            data_version INTEGER NOT NULL DEFAULT 0,
+            data_modified_at INTEGER NOT NULL DEFAULT 0,
+            avatar TEXT NOT NULL DEFAULT 'default_cat',
+            records_count INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_username_key ON users (username_key, id);
+        CREATE INDEX IF NOT EXISTS idx_users_username_ci ON users (username_ci, id);
+        
+        CREATE TABLE IF NOT EXISTS records (
+            -- 公開リンク（/shared/<id>）や冪等キーが指す記録IDを、削除後に別の記録へ使い回さない
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            subject TEXT NOT NULL,
+            content TEXT NOT NULL,
+            difficulty INTEGER NOT NULL,
+            learning_time INTEGER NOT NULL,
+            study_date TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            is_mastered INTEGER NOT NULL DEFAULT 0,
+            mastered_at TEXT,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            review_interval INTEGER NOT NULL DEFAULT 1,
+            review_ease REAL NOT NULL DEFAULT 2.5,
+            due_day INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_user_date ON records (user_id, study_date, id);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_records_user_id ON records (user_id, id);
+        -- 復習リスト用（未復習の記録と、復習済みで次の期限を待つ記録）
+        CREATE INDEX IF NOT EXISTS idx_records_review ON records (user_id, due_day, difficulty DESC, id)
+            WHERE is_mastered = 0;
+        CREATE INDEX IF NOT EXISTS idx_records_scheduled ON records (user_id, due_day, difficulty DESC, id)
+            WHERE is_mastered = 1;
+        
+        CREATE TABLE IF NOT EXISTS subject_stats (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            subject TEXT NOT NULL,
+            record_count INTEGER NOT NULL,
+            total_minutes INTEGER NOT NULL,
+            difficulty_sum INTEGER NOT NULL,
+            mastered_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, subject)
+        );
+        
+        CREATE TABLE IF NOT EXISTS daily_activity (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            day INTEGER NOT NULL,
+            record_count INTEGER NOT NULL,
+            total_minutes INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day)
+        );
+        
+        CREATE TABLE IF NOT EXISTS streak_runs (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            start_day INTEGER NOT NULL,
+            end_day INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (user_id, start_day)
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_streak_runs_end ON streak_runs (user_id, end_day);
+        CREATE INDEX IF NOT EXISTS idx_streak_runs_length ON streak_runs (user_id, length);
+        
+        CREATE TABLE IF NOT EXISTS search_terms (
+            user_id INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (user_id, term, record_id)
+        ) WITHOUT ROWID;
+        
+        CREATE TABLE IF NOT EXISTS xp_events (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            created_at INTEGER NOT NULL,
+            xp INTEGER NOT NULL,
+            old_level INTEGER NOT NULL,
+            new_level INTEGER NOT NULL,
+            reason TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_xp_events_level_ups ON xp_events (user_id, id) WHERE new_level > old_level;
+        
+        CREATE TABLE IF NOT EXISTS user_subjects (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            subject TEXT NOT NULL,
+            PRIMARY KEY (user_id, subject)
+        );
+        
+        CREATE TABLE IF NOT EXISTS hidden_subjects (
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            subject TEXT NOT NULL,
+            PRIMARY KEY (user_id, subject)
+        );
+        
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID;
+    """
+    
+    REBUILD_SUBJECT_STATS_SQL = (
+        "INSERT INTO subject_stats (user_id, subject, record_count, total_minutes, difficulty_sum, mastered_count) "
+        "SELECT user_id, subject, COUNT(*), SUM(learning_time), SUM(difficulty), SUM(is_mastered) "
+        "FROM records {where} GROUP BY user_id, subject")
+    
+    USER_COLUMNS = "id, username, password_hash, level, xp, total_xp, avatar, records_count, created_at"
+    RECORD_COLUMNS = ("id, subject, content, difficulty, learning_time, study_date, timestamp, "
+                      "is_mastered, mastered_at, review_count, review_interval, review_ease, due_day")
+    
+    def __init__(self, path='study_app.db', seed=True, pool_size=8):
+        self.path = path
+        self.pool_size = pool_size
+        self._local = threading.local()  # スレッドごとの接続
+        self._idle = queue.LifoQueue(pool_size)  # 返却されて次の利用を待つ接続
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._subjects_cache = {}  # user_id -> UserSubjects（users.subjects_version で無効化）
+        # gunicornのpreload等でforkされた場合、親の接続は子プロセスで使わない
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+        
+        conn = self._conn()
+        with conn:
+            conn.executescript(self.SCHEMA)
+        if seed:
+            self._seed_if_empty(conn)
+        self.release_connection()
+    
+    def _seed_if_empty(self, conn):
+        """空のデータベースならデフォルトテストユーザーを作成（複数ワーカーが同時に起動しても1回だけ）"""
+        if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+                return
+            test_user_id = self._insert_user(conn, 'test', generate_password_hash('test123', method=PASSWORD_HASH_METHOD),
+                                             level=5, xp=350, avatar='cat').id
+            self._insert_user(conn, 'admin', generate_password_hash('debug123', method=PASSWORD_HASH_METHOD),
+                              level=1, xp=0, avatar='default_cat')
+            conn.executemany("INSERT INTO user_subjects (user_id, subject) VALUES (?, ?)",
+                             [(test_user_id, subject) for subject in ['物理', '化学', '歴史']])
+    
+    def _reset_after_fork(self):
+        self._local = threading.local()
+        self._idle = queue.LifoQueue(self.pool_size)
+        self._connections = []
+        self._connections_lock = threading.Lock()
+    
+    def _conn(self):
+        """現在のスレッド用の接続を取得（なければプールから借りるか、作成して登録）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                # 同じSQL文字列はプリペアドステートメントとして接続ごとにキャッシュされる
+                # （プールを通して別スレッドに渡すので check_same_thread は外す。同時に使うのは1スレッドだけ）
+                conn = sqlite3.connect(self.path, cached_statements=256, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA foreign_keys=ON")
+                conn.execute("PRAGMA busy_timeout=5000")
+                with self._connections_lock:
+                    self._connections.append(conn)
+            self._local.conn = conn
+        return conn
+    
+    def release_connection(self):
+        """現在のスレッドの接続をプールに返す（プールが一杯なら閉じる）"""
+        conn = self._local.__dict__.pop('conn', None)
+        if conn is None:
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            with self._connections_lock:
+                self._connections.remove(conn)
+            conn.close()
+    
+    def close(self):
+        """プール内の全ての接続を閉じる"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+        self._idle = queue.LifoQueue(self.pool_size)
+    
+    def _row_to_user(self, row):
+        if row is None:
+            return None
+        user_id, username, password_hash, level, xp, total_xp, avatar, records_count, created_at = row
+        user = DummyUser(user_id, username, level, xp, avatar)
+        user.total_xp = total_xp
+        user.password_hash = password_hash
+        user.records_count = records_count
+        user.created_ts = int(datetime.fromisoformat(created_at).timestamp())
+        return user
+    
+    def _row_to_record(self, row):
+        if row is None:
+            return None
+        (record_id, subject, content, difficulty, learning_time, study_date, timestamp, is_mastered, mastered_at,
+         review_count, review_interval, review_ease, due_day) = row
+        record = DummyRecord(record_id, subject, content, difficulty, learning_time,
+                             date.fromisoformat(study_date))
+        record.created_ts = int(datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp())
+        record.is_mastered = bool(is_mastered)
+        record.mastered_ts = int(datetime.fromisoformat(mastered_at).timestamp()) if mastered_at else None
+        record.review_count = review_count
+        record.review_interval = review_interval
+        record.review_ease = review_ease
+        record.due_day = due_day
+        return record
+    
+    # ---- ユーザー ----
+    
+    def _insert_user(self, conn, username, password_hash, level=1, xp=0, avatar='default_cat'):
+        user = DummyUser(None, username, level, xp, avatar)
+        cur = conn.execute(
+            "INSERT INTO users (username, username_key, username_ci, password_hash, level, xp, total_xp, avatar, "
+            "created_at, data_modified_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (username, DummyDataStore.normalize_username(username),
+             DummyDataStore.normalize_username(username, case_insensitive=True),
+             password_hash, level, xp, total_xp_for_level(level) + xp, avatar, user.created_at.isoformat(),
+             user.created_ts))
+        user.id = cur.lastrowid
+        user.password_hash = password_hash
+        return user
+    
+    def add_user(self, username, password=None, level=1, xp=0, avatar='default_cat', password_hash=None):
+        password_hash = password_hash or generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+        conn = self._conn()
+        with conn:
+            return self._insert_user(conn, username, password_hash, level, xp, avatar)
+    
+    def get_user_by_username(self, username, case_insensitive=False):
+        if case_insensitive:
+            sql = f"SELECT {self.USER_COLUMNS} FROM users WHERE username_ci = ? ORDER BY id LIMIT 1"
+        else:
+            sql = f"SELECT {self.USER_COLUMNS} FROM users WHERE username_key = ? ORDER BY id LIMIT 1"
+        key = DummyDataStore.normalize_username(username, case_insensitive)
+        return self._row_to_user(self._conn().execute(sql, (key,)).fetchone())
+    
+    def get_user_by_id(self, user_id):
+        row = self._conn().execute(f"SELECT {self.USER_COLUMNS} FROM users WHERE id = ?", (user_id,)).fetchone()
+        return self._row_to_user(row)
+    
+    def save_user(self, user):
+        """アバター・記録数を保存（XPとレベルは add_user_xp で更新する）"""
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE users SET avatar = ?, records_count = ? WHERE id = ?",
+                         (user.avatar, user.records_count, user.id))
+            self._bump_data_version(conn, user.id)
+        return user
+    
+    def set_password_hash(self, user_id, password_hash):
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+    
+    def add_user_xp(self, user_id, xp_to_add, reason=""):
+        """XPを加算してレベルを更新（他のワーカーの更新を上書きしないよう排他で読み書き）"""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            level_state = self._add_user_xp(conn, user_id, xp_to_add, reason)
+            self._bump_data_version(conn, user_id)
+        return level_state
+    
+    def _add_user_xp(self, conn, user_id, xp_to_add, reason):
+        old_level, total_xp = conn.execute("SELECT level, total_xp FROM users WHERE id = ?", (user_id,)).fetchone()
+        total_xp += xp_to_add
+        new_level, new_xp = level_for_total_xp(total_xp)
+        conn.execute("UPDATE users SET level = ?, xp = ?, total_xp = ?, total_xp_earned = total_xp_earned + ?, "
+                     "total_level_ups = total_level_ups + ? WHERE id = ?",
+                     (new_level, new_xp, total_xp, xp_to_add, int(new_level > old_level), user_id))
+        # XP履歴に追記
+        conn.execute("INSERT INTO xp_events (user_id, created_at, xp, old_level, new_level, reason) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+                     (user_id, int(time.time()), xp_to_add, old_level, new_level, reason))
+        return old_level, new_level, new_xp
+    
+    def get_xp_stats(self, user_id):
+        row = self._conn().execute(
+            "SELECT total_level_ups, total_xp_earned FROM users WHERE id = ?", (user_id,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+    
+    def get_level_history(self, user_id, offset=0, limit=LEVEL_HISTORY_PER_PAGE):
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT created_at, xp, old_level, new_level, reason FROM xp_events "
+            "WHERE user_id = ? AND new_level > old_level ORDER BY id DESC LIMIT ? OFFSET ?",
+            (user_id, limit, offset)).fetchall()
+        return rows, self.get_xp_stats(user_id)[0]
+    
+    def rename_user(self, user_id, new_username):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "UPDATE users SET username = ?, username_key = ?, username_ci = ? WHERE id = ?",
+                (new_username, DummyDataStore.normalize_username(new_username),
+                 DummyDataStore.normalize_username(new_username, case_insensitive=True), user_id))
+            self._bump_data_version(conn, user_id)
+        if cur.rowcount == 0:
+            return None
+        return self.get_user_by_id(user_id)
+    
+    # ---- 教科 ----
+    
+    def get_subjects_version(self, user_id):
+        row = self._conn().execute("SELECT subjects_version FROM users WHERE id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+    
+    def _user_subjects(self, user_id):
+        """教科リストを取得（users.subjects_version が同じ間はプロセス内のキャッシュを使う）"""
+        version = self.get_subjects_version(user_id)
+        cached = self._subjects_cache.get(user_id)
+        if cached is not None and cached.version == version:
+            return cached
+        conn = self._conn()
+        subjects = UserSubjects(row[0] for row in conn.execute(
+            "SELECT subject FROM user_subjects WHERE user_id = ? ORDER BY rowid", (user_id,)))
+        subjects.hidden.update(row[0] for row in conn.execute(
+            "SELECT subject FROM hidden_subjects WHERE user_id = ?", (user_id,)))
+        subjects.version = version
+        self._subjects_cache[user_id] = subjects
+        return subjects
+    
+    def _bump_subjects_version(self, conn, user_id):
+        conn.execute("UPDATE users SET subjects_version = subjects_version + 1 WHERE id = ?", (user_id,))
+        self._bump_data_version(conn, user_id)
+    
+    def get_data_version(self, user_id):
+        return self.get_data_state(user_id)[0]
+    
+    def get_data_state(self, user_id):
+        row = self._conn().execute(
+            "SELECT data_version, data_modified_at FROM users WHERE id = ?", (user_id,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+    
+    def _bump_data_version(self, conn, user_id):
+        conn.execute("UPDATE users SET data_version = data_version + 1, data_modified_at = ? WHERE id = ?",
+                     (int(time.time()), user_id))
+    
+    def get_user_subjects(self, user_id):
+        """ユーザーの教科リストを取得"""
+        return self._user_subjects(user_id).visible()
+    
+    def has_user_subject(self, user_id, subject):
+        return subject in self._user_subjects(user_id)
+    
+    def add_user_subject(self, user_id, subject):
+        """ユーザーに新しい教科を追加"""
+        subjects = self._user_subjects(user_id)
+        if subject in subjects or len(subjects.custom) >= 10:
+            return False
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO user_subjects (user_id, subject) VALUES (?, ?)", (user_id, subject))
+            self._bump_subjects_version(conn, user_id)
+        return True
+    
+    def delete_user_subject(self, user_id, subject):
+        """ユーザーから教科を削除（最低1つの教科は残す）"""
+        if len(self.get_user_subjects(user_id)) <= 1:
+            return False
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM user_subjects WHERE user_id = ? AND subject = ?", (user_id, subject))
+            if not cur.rowcount:
+                if subject not in DEFAULT_SUBJECTS:
+                    return False
+                conn.execute("INSERT OR IGNORE INTO hidden_subjects (user_id, subject) VALUES (?, ?)",
+                             (user_id, subject))
+            self._bump_subjects_version(conn, user_id)
+        return True
+    
+    def count_custom_subjects(self, user_id):
+        return len(self._user_subjects(user_id).custom)
+    
+    def restore_user_subject(self, user_id, subject):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM hidden_subjects WHERE user_id = ? AND subject = ?", (user_id, subject))
+            if cur.rowcount:
+                self._bump_subjects_version(conn, user_id)
+        return cur.rowcount > 0
+    
+    # ---- 学習記録 ----
+    
+    def add_record(self, user_id, subject, content, difficulty=3, learning_time=30, study_date=None):
+        return self.add_records(user_id, [(subject, content, difficulty, learning_time, study_date)])[0]
+    
+    def add_records(self, user_id, rows):
+        """(教科, 内容, 難易度, 学習時間, 学習日) の列を1つのトランザクションで追加"""
+        conn = self._conn()
+        with conn:
+            records = self._insert_records(conn, user_id, rows)
+            if records:
+                self._bump_data_version(conn, user_id)
+        return records
+    
+    def _insert_records(self, conn, user_id, rows):
+        records = []
+        for subject, content, difficulty, learning_time, study_date in rows:
+            record = DummyRecord(None, subject, content, difficulty, learning_time, study_date)
+            cur = conn.execute(
+                "INSERT INTO records (user_id, subject, content, difficulty, learning_time, study_date, "
+                "timestamp, due_day) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, subject, content, difficulty, learning_time, record.study_date, record.timestamp,
+                 record.due_day))
+            record.id = cur.lastrowid
+            self._update_subject_stats(conn, user_id, subject, learning_time, difficulty, False, 1)
+            self._update_daily_activity(conn, user_id, record.study_date, learning_time, 1)
+            self._index_record(conn, user_id, record.id, subject, content)
+            records.append(record)
+        return records
+    
+    def sync_records(self, user_id, keyed_rows, reason=""):
+        """冪等キーの確認・記録の追加・XPの加算・記録数の更新を1つのトランザクションで行う"""
+        keyed_rows = list(keyed_rows)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            applied = {}
+            keys = list({key: None for key, _ in keyed_rows})
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                applied.update(conn.execute(
+                    f"SELECT key, record_id FROM idempotency_keys WHERE user_id = ? "
+                    f"AND key IN ({', '.join('?' * len(chunk))})", (user_id, *chunk)).fetchall())
+            duplicates = {key: applied[key] for key, _ in keyed_rows if key in applied}
+            
+            new_keys, new_rows = [], []
+            for key, row in keyed_rows:
+                if key not in applied:
+                    applied[key] = None  # 同じバッチ内の重複
+                    new_keys.append(key)
+                    new_rows.append(row)
+            created = dict(zip(new_keys, self._insert_records(conn, user_id, new_rows)))
+            conn.executemany("INSERT INTO idempotency_keys (user_id, key, record_id) VALUES (?, ?, ?)",
+                             [(user_id, key, record.id) for key, record in created.items()])
+            
+            xp = sum(xp_for_record(record.learning_time, record.difficulty) for record in created.values())
+            if xp:
+                level_state = self._add_user_xp(conn, user_id, xp, reason)
+            else:
+                level, current_xp = conn.execute("SELECT level, xp FROM users WHERE id = ?", (user_id,)).fetchone()
+                level_state = (level, level, current_xp)
+            if created:
+                conn.execute("UPDATE users SET records_count = (SELECT COUNT(*) FROM records WHERE user_id = ?) "
+                             "WHERE id = ?", (user_id, user_id))
+                self._bump_data_version(conn, user_id)
+        return created, duplicates, level_state
+    
+    def _index_record(self, conn, user_id, record_id, subject, content):
+        conn.executemany("INSERT INTO search_terms (user_id, term, record_id, tf) VALUES (?, ?, ?, ?)",
+                         [(user_id, term, record_id, count)
+                          for term, count in index_terms(record_search_text(subject, content)).items()])
+    
+    def search_records(self, user_id, query, offset=0, limit=SEARCH_RESULTS_PER_PAGE):
+        conn = self._conn()
+        postings = {}
+        for term in query_terms(query):
+            docs = dict(conn.execute("SELECT record_id, tf FROM search_terms WHERE user_id = ? AND term = ?",
+                                     (user_id, term)).fetchall())
+            if not docs:
+                return [], 0
+            postings[term] = docs
+        record_ids, total = rank_search_hits(postings, self.count_user_records(user_id), offset, limit)
+        if not record_ids:
+            return [], total
+        placeholders = ', '.join('?' * len(record_ids))
+        rows = conn.execute(f"SELECT {self.RECORD_COLUMNS} FROM records WHERE user_id = ? AND id IN ({placeholders})",
+                            (user_id, *record_ids)).fetchall()
+        records = {record.id: record for record in map(self._row_to_record, rows)}
+        return [records[record_id] for record_id in record_ids], total
+    
+    def _update_daily_activity(self, conn, user_id, study_date, learning_time, sign):
+        """日別集計を増減し、学習した日が増えた・なくなったときは連続学習期間も更新"""
+        day = date.fromisoformat(study_date).toordinal()
+        record_count = conn.execute(
+            "INSERT INTO daily_activity (user_id, day, record_count, total_minutes) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, day) DO UPDATE SET "
+            "record_count = record_count + excluded.record_count, "
+            "total_minutes = total_minutes + excluded.total_minutes "
+            "RETURNING record_count",
+            (user_id, day, sign, sign * learning_time)).fetchone()[0]
+        if record_count == 1 and sign > 0:
+            self._streak_add_day(conn, user_id, day)
+        elif record_count <= 0:
+            conn.execute("DELETE FROM daily_activity WHERE user_id = ? AND day = ?", (user_id, day))
+            self._streak_remove_day(conn, user_id, day)
+    
+    def _streak_add_day(self, conn, user_id, day):
+        start = end = day
+        left = conn.execute("SELECT start_day FROM streak_runs WHERE user_id = ? AND end_day = ?",
+                            (user_id, day - 1)).fetchone()
+        if left:
+            start = left[0]
+            conn.execute("DELETE FROM streak_runs WHERE user_id = ? AND start_day = ?", (user_id, start))
+        right = conn.execute("SELECT end_day FROM streak_runs WHERE user_id = ? AND start_day = ?",
+                             (user_id, day + 1)).fetchone()
+        if right:
+            end = right[0]
+            conn.execute("DELETE FROM streak_runs WHERE user_id = ? AND start_day = ?", (user_id, day + 1))
+        conn.execute("INSERT INTO streak_runs (user_id, start_day, end_day, length) VALUES (?, ?, ?, ?)",
+                     (user_id, start, end, end - start + 1))
+    
+    def _streak_remove_day(self, conn, user_id, day):
+        run = conn.execute(
+            "SELECT start_day, end_day FROM streak_runs WHERE user_id = ? AND start_day <= ? "
+            "ORDER BY start_day DESC LIMIT 1", (user_id, day)).fetchone()
+        if run is None or run[1] < day:
+            return
+        start, end = run
+        conn.execute("DELETE FROM streak_runs WHERE user_id = ? AND start_day = ?", (user_id, start))
+        for new_start, new_end in ((start, day - 1), (day + 1, end)):
+            if new_start <= new_end:
+                conn.execute("INSERT INTO streak_runs (user_id, start_day, end_day, length) VALUES (?, ?, ?, ?)",
+                             (user_id, new_start, new_end, new_end - new_start + 1))
+    
+    def get_streaks(self, user_id, today=None):
+        conn = self._conn()
+        today = (today or date.today()).toordinal()
+        longest = conn.execute("SELECT MAX(length) FROM streak_runs WHERE user_id = ?", (user_id,)).fetchone()[0]
+        run = conn.execute(
+            "SELECT start_day, end_day FROM streak_runs WHERE user_id = ? AND start_day <= ? "
+            "ORDER BY start_day DESC LIMIT 1", (user_id, today)).fetchone()
+        current = 0
+        if run is not None and run[1] >= today - 1:
+            current = min(run[1], today) - run[0] + 1
+        return current, longest or 0
+    
+    def _update_subject_stats(self, conn, user_id, subject, learning_time, difficulty, is_mastered, sign):
+        """教科別集計を増減（記録の追加・削除と同じトランザクションで呼ぶ）"""
+        conn.execute(
+            "INSERT INTO subject_stats (user_id, subject, record_count, total_minutes, difficulty_sum, mastered_count) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, subject) DO UPDATE SET "
+            "record_count = record_count + excluded.record_count, "
+            "total_minutes = total_minutes + excluded.total_minutes, "
+            "difficulty_sum = difficulty_sum + excluded.difficulty_sum, "
+            "mastered_count = mastered_count + excluded.mastered_count",
+            (user_id, subject, sign, sign * learning_time, sign * difficulty, sign * int(bool(is_mastered))))
+        if sign < 0:
+            conn.execute("DELETE FROM subject_stats WHERE user_id = ? AND subject = ? AND record_count <= 0",
+                         (user_id, subject))
+    
+    def get_subject_stats(self, user_id):
+        rows = self._conn().execute(
+            "SELECT subject, record_count, total_minutes, difficulty_sum, mastered_count "
+            "FROM subject_stats WHERE user_id = ?", (user_id,))
+        return subject_stats_to_list({row[0]: list(row[1:]) for row in rows})
+    
+    def rebuild_subject_stats(self, user_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM subject_stats WHERE user_id = ?", (user_id,))
+            conn.execute(self.REBUILD_SUBJECT_STATS_SQL.format(where="WHERE user_id = ?"), (user_id,))
+    
+    def get_user_records(self, user_id):
+        """ユーザーの記録を学習日の古い順で取得"""
+        rows = self._conn().execute(
+            f"SELECT {self.RECORD_COLUMNS} FROM records WHERE user_id = ? ORDER BY study_date, id", (user_id,))
+        return [self._row_to_record(row) for row in rows]
+    
+    def count_user_records(self, user_id):
+        return self._conn().execute("SELECT COUNT(*) FROM records WHERE user_id = ?", (user_id,)).fetchone()[0]
+    
+    def get_record(self, user_id, record_id):
+        row = self._conn().execute(
+            f"SELECT {self.RECORD_COLUMNS} FROM records WHERE user_id = ? AND id = ?", (user_id, record_id)).fetchone()
+        return self._row_to_record(row)
+    
+    def get_record_owner(self, record_id):
+        row = self._conn().execute("SELECT user_id FROM records WHERE id = ?", (record_id,)).fetchone()
+        return row[0] if row else None
+    
+    def get_records_page(self, user_id, cursor=None, limit=RECORDS_PER_PAGE):
+        """(study_date, id) のキーセットで、cursorより古い記録を新しい順にlimit件取得"""
+        if cursor is None:
+            rows = self._conn().execute(
+                f"SELECT {self.RECORD_COLUMNS} FROM records WHERE user_id = ? "
+                "ORDER BY study_date DESC, id DESC LIMIT ?", (user_id, limit + 1)).fetchall()
+        else:
+            rows = self._conn().execute(
+                f"SELECT {self.RECORD_COLUMNS} FROM records WHERE user_id = ? AND (study_date, id) < (?, ?) "
+                "ORDER BY study_date DESC, id DESC LIMIT ?", (user_id, cursor[0], cursor[1], limit + 1)).fetchall()
+        page = [self._row_to_record(row) for row in rows[:limit]]
+        next_cursor = (page[-1].study_date, page[-1].id) if len(rows) > limit else None
+        return page, next_cursor
+    
+    def iter_newest_records(self, user_id, limit=None):
+        rows = self._conn().execute(
+            f"SELECT {self.RECORD_COLUMNS} FROM records WHERE user_id = ? "
+            "ORDER BY study_date DESC, id DESC LIMIT ?", (user_id, -1 if limit is None else limit))
+        return (self._row_to_record(row) for row in rows)
+    
+    def get_daily_activity(self, user_id, day):
+        row = self._conn().execute(
+            "SELECT record_count, total_minutes FROM daily_activity WHERE user_id = ? AND day = ?",
+            (user_id, day.toordinal())).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+    
+    def get_daily_activity_range(self, user_id, start, end):
+        rows = self._conn().execute(
+            "SELECT day, record_count, total_minutes FROM daily_activity WHERE user_id = ? AND day BETWEEN ? AND ?",
+            (user_id, start.toordinal(), end.toordinal()))
+        return {day: (record_count, total_minutes) for day, record_count, total_minutes in rows}
+    
+    def delete_record(self, user_id, record_id):
+        conn = self._conn()
+        with conn:
+            # 同じ記録を同時に削除されても集計を二重に減らさないよう、読む前に書き込みロックを取る
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT subject, learning_time, difficulty, is_mastered, study_date, content FROM records "
+                "WHERE user_id = ? AND id = ?", (user_id, record_id)).fetchone()
+            if row is None:
+                return False
+            cur = conn.execute("DELETE FROM records WHERE user_id = ? AND id = ?", (user_id, record_id))
+            if cur.rowcount != 1:
+                return False
+            subject, learning_time, difficulty, is_mastered, study_date, content = row
+            self._update_subject_stats(conn, user_id, subject, learning_time, difficulty, is_mastered, -1)
+            self._update_daily_activity(conn, user_id, study_date, learning_time, -1)
+            conn.executemany("DELETE FROM search_terms WHERE user_id = ? AND term = ? AND record_id = ?",
+                             [(user_id, term, record_id)
+                              for term in index_terms(record_search_text(subject, content))])
+            self._bump_data_version(conn, user_id)
+        return True
+    
+    def toggle_mastery(self, user_id, record_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            record = self.get_record(user_id, record_id)
+            if record is None:
+                return None
+            record.is_mastered = not record.is_mastered
+            if record.is_mastered:
+                record.mastered_ts = int(time.time())
+                schedule_review(record, date.today())
+            else:
+                record.mastered_ts = None
+                reset_review(record, date.today())
+            self._save_review_state(conn, user_id, record)
+            conn.execute("UPDATE subject_stats SET mastered_count = mastered_count + ? WHERE user_id = ? AND subject = ?",
+                         (1 if record.is_mastered else -1, user_id, record.subject))
+            self._bump_data_version(conn, user_id)
+        return record
+    
+    def complete_review(self, user_id, record_id, today=None):
+        today = today or date.today()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            record = self.get_record(user_id, record_id)
+            if record is None or (record.is_mastered and record.due_day > today.toordinal()):
+                return None
+            newly_mastered = not record.is_mastered
+            if newly_mastered:
+                record.is_mastered = True
+                record.mastered_ts = int(time.time())
+            schedule_review(record, today)
+            self._save_review_state(conn, user_id, record)
+            if newly_mastered:
+                conn.execute("UPDATE subject_stats SET mastered_count = mastered_count + 1 "
+                             "WHERE user_id = ? AND subject = ?", (user_id, record.subject))
+            self._bump_data_version(conn, user_id)
+        return record
+    
+    def _save_review_state(self, conn, user_id, record):
+        conn.execute(
+            "UPDATE records SET is_mastered = ?, mastered_at = ?, review_count = ?, review_interval = ?, "
+            "review_ease = ?, due_day = ? WHERE user_id = ? AND id = ?",
+            (int(record.is_mastered), record.mastered_at.isoformat() if record.mastered_at else None,
+             record.review_count, record.review_interval, record.review_ease, record.due_day,
+             user_id, record.id))
+    
+    def get_due_reviews(self, user_id, limit, today=None):
+        # 未復習の記録と期限が来た復習済みの記録を、それぞれの部分索引から読んでまとめる
+        today = (today or date.today()).toordinal()
+        rows = self._conn().execute(
+            f"SELECT {self.RECORD_COLUMNS} FROM (SELECT {self.RECORD_COLUMNS} FROM records "
+            "WHERE user_id = ? AND is_mastered = 0 ORDER BY due_day, difficulty DESC, id LIMIT ?) "
+            f"UNION ALL SELECT {self.RECORD_COLUMNS} FROM (SELECT {self.RECORD_COLUMNS} FROM records "
+            "WHERE user_id = ? AND is_mastered = 1 AND due_day <= ? ORDER BY due_day, difficulty DESC, id LIMIT ?) "
+            "ORDER BY due_day, difficulty DESC, id LIMIT ?",
+            (user_id, limit, user_id, today, limit, limit)).fetchall()
+        return [self._row_to_record(row) for row in rows]
+    
+    def count_unmastered_records(self, user_id):
+        # 教科別集計から求める（記録は走査しない）
+        return self._conn().execute(
+            "SELECT COALESCE(SUM(record_count - mastered_count), 0) FROM subject_stats WHERE user_id = ?",
+            (user_id,)).fetchone()[0]
+
+# ========================
+# 描画済みHTML断片のキャッシュ
+# ========================
+class FragmentCache:
+    """(user_id, 断片名, 版数, ...) をキーにしたLRUキャッシュ（合計サイズが上限を超えたら古いものから捨てる）"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # key -> (html, サイズ)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+    
+    def get_or_render(self, key, render):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        
+        html = Markup(render())
+        size = sys.getsizeof(html)
+        if size > self.max_bytes:
+            return html
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (html, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+        return html
+    
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+# 有効期間つきのLRUキャッシュ
+class TtlCache:
+    """件数の上限を超えたら最も古く使われたものから捨て、期限切れのものは読み出し時に捨てる"""
+    
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()  # key -> (期限, 値)
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+    
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+# ========================
+# 計測（レイテンシのヒストグラム）
+# ========================
+# ヒストグラムのバケット上限（秒）: ストアの呼び出しは1ms未満が多いので細かめに取る
+METRICS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'study_app_request_duration_seconds': 'リクエスト処理時間（エンドポイント別）',
+    'study_app_store_call_duration_seconds': 'データストアのメソッド呼び出し時間',
+    'study_app_template_render_duration_seconds': 'テンプレートの描画時間',
+    'study_app_password_hash_duration_seconds': 'パスワードのハッシュ計算・検証時間（待ち時間を含む）',
+}
+
+class LatencyHistogram:
+    """バケットごとの件数と合計・件数だけを持つヒストグラム（記録は二分探索1回と加算のみ）"""
+    __slots__ = ('counts', 'sum', 'count', '_lock')
+    
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds):
+        i = bisect.bisect_left(METRICS_BUCKETS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+    
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    """(メトリクス名, ラベル) ごとのヒストグラムを持ち、Prometheusのテキスト形式で出力する"""
+    
+    def __init__(self):
+        self.histograms = {}  # (name, ((ラベル名, 値), ...)) -> LatencyHistogram
+        self._lock = threading.Lock()
+    
+    def observe(self, name, labels, seconds):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram())
+        histogram.observe(seconds)
+    
+    def timed(self, func, name, labels):
+        """func の呼び出し時間を記録する関数を返す"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(name, labels, time.perf_counter() - start)
+        return wrapper
+    
+    def render(self):
+        lines = []
+        with self._lock:
+            items = sorted(self.histograms.items())
+        for name, group in itertools.groupby(items, key=lambda item: item[0][0]):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (_, labels), histogram in group:
+                counts, total, count = histogram.snapshot()
+                label_text = ','.join(f'{label}="{_escape_label(value)}"' for label, value in labels)
+                cumulative = 0
+                for bound, bucket_count in zip(METRICS_BUCKETS + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{label_text}}} {total!r}")
+                lines.append(f"{name}_count{{{label_text}}} {count}")
+        return '\n'.join(lines) + '\n'
+
+def observe_latency(name, labels, seconds):
+    """現在のアプリの計測値に記録（アプリの外や計測が無効なときは何もしない）"""
+    if has_app_context():
+        metrics = current_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.observe(name, labels, seconds)
+
+class InstrumentedStore:
+    """データストアの公開メソッドの呼び出し時間を記録する代理（ストア内部での呼び出しは数えない）"""
+    
+    def __init__(self, store, metrics):
+        self._store = store
+        self._metrics = metrics
+    
+    def __getattr__(self, name):
+        value = getattr(self._store, name)
+        if name.startswith('_') or not callable(value):
+            return value
+        timed = self._metrics.timed(value, 'study_app_store_call_duration_seconds', (('method', name),))
+        # 次からは __getattr__ を通らずに見つかるようにしておく
+        setattr(self, name, timed)
+        return timed
+
+class TimedTemplate(Template):
+    """render() の所要時間をテンプレート名ごとに記録するテンプレート（include先は呼び出し元に含まれる）"""
+    
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            metrics = self.environment.app.extensions.get('metrics')
+            if metrics is not None:
+                metrics.observe('study_app_template_render_duration_seconds',
+                                (('template', self.name or '<string>'),), time.perf_counter() - start)
+
+def install_metrics(app):
+    """リクエスト・テンプレートの計測を有効にする"""
+    metrics = app.extensions['metrics'] = Metrics()
+    app.jinja_env.template_class = TimedTemplate
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.teardown_request
+    def observe_request_time(exc):
+        started = g.pop('request_started', None)
+        if started is not None:
+            metrics.observe('study_app_request_duration_seconds',
+                            (('endpoint', request.endpoint or '<unmatched>'),), time.perf_counter() - started)
+    
+    return metrics
+
+def get_fragment_cache():
+    """現在のアプリの断片キャッシュを取得"""
+    return current_app.extensions['fragment_cache']
+
+def create_data_store(config):
+    """設定に応じてデータストアを作成（DATA_STORE = 'memory' または 'sqlite'）"""
+    seed = config.get('SEED_DATA', True)
+    if config.get('DATA_STORE') == 'sqlite':
+        return SqliteDataStore(config['SQLITE_PATH'], seed=seed, pool_size=config.get('SQLITE_POOL_SIZE', 8))
+    return DummyDataStore(seed=seed)
+
+_data_store_lock = threading.Lock()
+
+def get_data_store():
+    """現在のアプリのデータストアを取得（最初に使うときに作成）"""
+    app = current_app._get_current_object()
+    store = app.extensions.get('data_store')
+    if store is None:
+        with _data_store_lock:
+            store = app.extensions.get('data_store')
+            if store is None:
+                store = create_data_store(app.config)
+                if 'metrics' in app.extensions:
+                    store = InstrumentedStore(store, app.extensions['metrics'])
+                app.extensions['data_store'] = store
+    return store
+
+# グローバルデータストア（現在のアプリのストアを指す）
+dummy_store = LocalProxy(get_data_store)
+
+# ========================
+# パスワードハッシュ処理
+# ========================
+
+class HashingOverloadedError(Exception):
+    """ハッシュ計算の待ちが上限を超えた（しばらくして再試行すればよい）"""
+
+class PasswordHashingService:
+    """pbkdf2の計算をリクエスト処理のスレッドから外し、別プロセスで行う"""
+    
+    def __init__(self, method, max_workers=2, max_pending=16, timeout=10):
+        self.method = method
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    def _get_executor(self):
+        """プロセスプールは最初に使うときに作成"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+    
+    def _run(self, operation, func, *args):
+        # 待ち行列が一杯なら計算を始めずにすぐ断る
+        if not self._pending.acquire(blocking=False):
+            raise HashingOverloadedError()
+        start = time.perf_counter()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._pending.release()
+            raise
+        # 待ちの枠は計算が本当に終わる（または取り消される）まで返さない
+        future.add_done_callback(lambda _: self._pending.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            # まだ始まっていなければ取り消す（計算中のものは終わるまで枠を使い続ける）
+            future.cancel()
+            raise HashingOverloadedError()
+        finally:
+            observe_latency('study_app_password_hash_duration_seconds', (('operation', operation),),
+                            time.perf_counter() - start)
+    
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+    
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+    
+    def needs_rehash(self, password_hash):
+        """保存済みハッシュの方式・コストが現在の設定と違うか"""
+        stored = password_hash.split('$', 1)[0].split(':')
+        wanted = self.method.split(':')
+        # 反復回数を指定していなければ方式だけを比べる
+        return stored[:len(wanted)] != wanted
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHashingService(PASSWORD_HASH_METHOD,
+                                         max_workers=PASSWORD_HASH_WORKERS,
+                                         max_pending=PASSWORD_HASH_MAX_PENDING,
+                                         timeout=PASSWORD_HASH_TIMEOUT)
+
+def hashing_overloaded_response(template):
+    """ハッシュ計算が混雑しているときの応答（503 + Retry-After）"""
+    flash('ただいま混雑しています。しばらくしてから再度お試しください', 'error')
+    response = current_app.make_response((render_template(template), 503))
+    response.headers['Retry-After'] = '1'
+    return response
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -260,23 +2301,185 @@ def get_user_custom_subjects(user_id):
 
 def add_xp_and_check_level_up(user, xp_to_add, reason=""):
     """XP追加とレベルアップチェック（ダミー）"""
-    old_level = user.level
-    user.xp += xp_to_add
-    
-    # レベルアップチェック
-    xp_needed_for_next = user.xp_to_next
-    while user.xp >= xp_needed_for_next:
-        user.level += 1
-        user.xp -= xp_needed_for_next
-        xp_needed_for_next = user.xp_to_next
-    
-    new_level = user.level
+    # レベルアップチェック（複数ワーカーでも食い違わないようストア側で加算）
+    old_level, new_level, new_xp = dummy_store.add_user_xp(user.id, xp_to_add, reason)
+    user.level = new_level
+    user.xp = new_xp
+    user.total_xp = total_xp_for_level(new_level) + new_xp
     
     if new_level > old_level:
         flash(f"レベルアップ！ レベル{old_level} → レベル{new_level}", "success")
     
     return new_level > old_level
 
+def add_xp_for_records(user, records, reason=""):
+    """複数の学習記録のXPをまとめて1回で加算（インポート・再計算用）"""
+    total_xp = sum(xp_for_record(r.learning_time, r.difficulty) for r in records)
+    if total_xp <= 0:
+        return 0, False
+    return total_xp, add_xp_and_check_level_up(user, total_xp, reason)
+
+def encode_records_cursor(key):
+    """ページ送り用カーソル (study_date, id) を文字列に変換"""
+    if key is None:
+        return None
+    study_date, record_id = key
+    return f"{study_date}_{record_id}"
+
+def decode_records_cursor(value):
+    """カーソル文字列を (study_date, id) に戻す（不正な値はNone＝先頭ページ）"""
+    if not value:
+        return None
+    try:
+        study_date, record_id = value.split('_', 1)
+        datetime.strptime(study_date, '%Y-%m-%d')
+        return (study_date, int(record_id))
+    except ValueError:
+        return None
+
+def get_records_page_args():
+    """クエリ文字列からカーソルと件数を取得"""
+    cursor = decode_records_cursor(request.args.get('cursor', ''))
+    per_page = request.args.get('per_page', RECORDS_PER_PAGE, type=int)
+    per_page = max(1, min(per_page, RECORDS_PER_PAGE_MAX))
+    return cursor, per_page
+
+def record_to_dict(record):
+    """学習記録をJSON用の辞書に変換"""
+    return {
+        'id': record.id,
+        'subject': record.subject,
+        'content': record.content,
+        'difficulty': record.difficulty,
+        'learning_time': record.learning_time,
+        'study_date': record.study_date,
+        'timestamp': record.timestamp,
+        'is_mastered': record.is_mastered,
+        'due_date': record.due_date,
+    }
+
+def iter_import_rows(stream, fmt):
+    """アップロードを1行ずつ読み、(行番号, 行の辞書) を返す（JSONとして読めない行は None）"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError:
+            yield line_no, None
+
+def parse_import_row(row):
+    """インポートの1行を add_records に渡す形に変換（不正な行は ValueError）"""
+    if not isinstance(row, dict):
+        raise ValueError('JSONのオブジェクトではありません')
+    subject = str(row.get('subject') or '').strip()
+    content = str(row.get('content') or '').strip()
+    if not subject or not content:
+        raise ValueError('科目と学習内容は必須です')
+    difficulty = int(row.get('difficulty') or 3)
+    if not 1 <= difficulty <= 5:
+        raise ValueError('難易度は1〜5です')
+    learning_time = int(row.get('learning_time') or 30)
+    if learning_time < 1:
+        raise ValueError('学習時間は1分以上です')
+    study_date = row.get('study_date')
+    study_date = date.fromisoformat(str(study_date)) if study_date else datetime.utcnow().date()
+    return subject, content, difficulty, learning_time, study_date
+
+def import_record_rows(user, rows):
+    """(行番号, 行) の列を検証しながら IMPORT_BATCH_SIZE 件ずつ追加（XPの加算はバッチごとに1回）"""
+    summary = {'imported': 0, 'skipped': 0, 'xp': 0, 'level_up': False, 'errors': []}
+    batch = []
+    
+    def add_batch():
+        records = dummy_store.add_records(user.id, batch)
+        xp, level_up = add_xp_for_records(user, records, "インポート")
+        summary['imported'] += len(records)
+        summary['xp'] += xp
+        summary['level_up'] = summary['level_up'] or level_up
+        batch.clear()
+    
+    try:
+        for line_no, row in rows:
+            try:
+                batch.append(parse_import_row(row))
+            except (TypeError, ValueError) as e:
+                summary['skipped'] += 1
+                if len(summary['errors']) < IMPORT_MAX_ERRORS:
+                    summary['errors'].append({'line': line_no, 'error': str(e)})
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                add_batch()
+    except (csv.Error, UnicodeDecodeError) as e:
+        # ファイル自体が読めなくなったら、それまでの行だけ取り込む
+        summary['errors'].append({'line': None, 'error': f"読み込みを中断しました: {e}"})
+    if batch:
+        add_batch()
+    return summary
+
+def iter_export_csv(records):
+    """記録をCSVの断片として EXPORT_CHUNK_ROWS 件ずつ返す（Excelで開けるよう先頭にBOM）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_FIELDS)
+    for i, record in enumerate(records, 1):
+        row = record_to_dict(record)
+        writer.writerow([row[field] for field in EXPORT_FIELDS])
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_export_jsonl(records):
+    """記録をJSON Linesの断片として EXPORT_CHUNK_ROWS 件ずつ返す"""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record_to_dict(record), ensure_ascii=False))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines.clear()
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def conditional_page(view):
+    """ユーザーのデータ版数からETagを作り、ブラウザの版と同じなら描画せずに304を返す"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified_ts = dummy_store.get_data_state(current_user.id)
+        # 日付が変わるとカレンダーや復習期限の表示も変わるので今日の日付も含める
+        # （表示待ちのメッセージが増えたときも古い版を使わせないよう、それも含める）
+        key = (current_app.config['ETAG_SALT'], request.endpoint, request.query_string,
+               current_user.id, version, date.today().toordinal(), session.get('_flashes'))
+        etag = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        last_modified = datetime.fromtimestamp(modified_ts, timezone.utc) if modified_ts else None
+        
+        if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = current_app.make_response(view(*args, **kwargs))
+        else:
+            response = Response(status=304)
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
+    return wrapper
+
+def render_fragment(fragment, render, *key_parts):
+    """ログイン中ユーザーの描画済みHTML断片をキャッシュから取得（なければ render() で作成）"""
+    user_id = current_user.id
+    key = (user_id, fragment, dummy_store.get_data_version(user_id), *key_parts)
+    return get_fragment_cache().get_or_render(key, render)
+
 # 🔧 修正ポイント1: カレンダー生成関数を追加
 def generate_calendar_days(year, month):
     """カレンダー日付を生成する関数（HTMLテンプレート用）"""
@@ -290,20 +2493,22 @@ def generate_calendar_days(year, month):
     calendar_days = []
     today = date.today()
     
-    # ユーザーの学習記録がある日付を抽出
-    user_records = dummy_store.get_user_records(current_user.id) if current_user.is_authenticated else []
-    record_dates = {r.study_date for r in user_records}
+    # 日別の学習記録（記録件数に関係なく表示日数分だけ参照）
+    user_id = current_user.id if current_user.is_authenticated else None
     
     # 月の日付を取得（前月・次月の日付も含む）
     month_days = cal.monthdatescalendar(year, month)
     
+    # 表示する全日の学習記録を1回で取得
+    activity = dummy_store.get_daily_activity_range(user_id, month_days[0][0], month_days[-1][-1])
+    
     for week in month_days:
         for day_date in week:
             # 当月かどうか
             is_current_month = day_date.month == month
             
             # 学習記録があるか
-            has_record = day_date.strftime('%Y-%m-%d') in record_dates
+            record_count, study_minutes = activity.get(day_date.toordinal(), (0, 0))
             
             # 今日かどうか
             is_today = day_date == today
@@ -314,48 +2519,63 @@ def generate_calendar_days(year, month):
             calendar_days.append({
                 'day': day_date.day,
                 'is_padding': not is_current_month,  # 前月/次月の日付
-                'full_date': day_date.strftime('%Y-%m-%d'),
+                'full_date': day_date.isoformat(),
                 'day_name': day_name,
                 'is_today': is_today,
-                'has_record': has_record
+                'has_record': record_count > 0,
+                'record_count': record_count,
+                'study_minutes': study_minutes
             })
     
     return calendar_days
 
-@app.route('/')
+@route('/')
 def index():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
         
-        print(f"🔍 ログイン試行: username={username}")
+        log = get_route_logger()
+        log.info("ログイン試行: username=%s", username)
         
         # ダミーデータストアからユーザーを取得
-        user = dummy_store.get_user_by_username(username)
+        user = dummy_store.get_user_by_username(username, case_insensitive=USERNAME_CASE_INSENSITIVE)
         
         if user:
             # パスワード検証
             try:
-                if hasattr(user, 'password_hash') and check_password_hash(user.password_hash, password):
+                if hasattr(user, 'password_hash') and password_hasher.verify(user.password_hash, password):
+                    # ハッシュの設定が変わっていれば新しい設定で保存し直す
+                    if password_hasher.needs_rehash(user.password_hash):
+                        try:
+                            dummy_store.set_password_hash(user.id, password_hasher.hash(password))
+                        except HashingOverloadedError:
+                            pass  # 次回のログイン時に再ハッシュする
                     login_user(user)
                     flash('ログイン成功！', 'success')
                     return redirect(url_for('dashboard'))
                 else:
                     flash('パスワードが正しくありません', 'error')
+            except HashingOverloadedError:
+                return hashing_overloaded_response('login.html')
             except Exception as e:
-                print(f"⚠️ パスワード検証エラー: {e}")
+                log.warning("パスワード検証エラー: %s", e)
                 flash('認証エラーが発生しました', 'error')
         else:
             # デバッグモード: 任意のユーザーでログイン
             if DEBUG_MODE:
-                print(f"✅ デバッグモード: 新規ユーザー '{username}' を作成")
-                user = dummy_store.add_user(username, password)
+                log.info("デバッグモード: 新規ユーザー '%s' を作成", username)
+                try:
+                    password_hash = password_hasher.hash(password)
+                except HashingOverloadedError:
+                    return hashing_overloaded_response('login.html')
+                user = dummy_store.add_user(username, password_hash=password_hash)
                 login_user(user)
                 flash('デバッグモード: 新規ユーザーでログインしました', 'warning')
                 return redirect(url_for('dashboard'))
@@ -366,13 +2586,14 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/signup', methods=['GET', 'POST'])
+@route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
         
-        print(f"🔍 新規登録試行: username={username}")
+        log = get_route_logger()
+        log.info("新規登録試行: username=%s", username)
         
         # バリデーション
         if len(username) < 3:
@@ -384,32 +2605,56 @@ def signup():
             return render_template('signup.html')
         
         # 既存ユーザーチェック
-        existing_user = dummy_store.get_user_by_username(username)
+        existing_user = dummy_store.get_user_by_username(username, case_insensitive=USERNAME_CASE_INSENSITIVE)
         if existing_user:
             flash('このユーザー名は既に使用されています', 'error')
             return render_template('signup.html')
         
-        # 新規ユーザー作成
-        new_user = dummy_store.add_user(username, password)
+        # 新規ユーザー作成（ハッシュ計算は別プロセスで）
+        try:
+            password_hash = password_hasher.hash(password)
+        except HashingOverloadedError:
+            return hashing_overloaded_response('signup.html')
+        new_user = dummy_store.add_user(username, password_hash=password_hash)
         login_user(new_user)
         
-        print(f"✅ ユーザー登録成功: {username}")
+        log.info("ユーザー登録成功: %s", username)
         flash('アカウント登録が完了しました！', 'success')
         return redirect(url_for('dashboard'))
     
     return render_template('signup.html')
 
 # 🔧 修正ポイント2: dashboard()関数を更新
-@app.route('/dashboard')
+@route('/dashboard')
 @login_required
+@conditional_page
 def dashboard():
     # カレンダー用のデータ準備
     today = datetime.now()
     year = today.year
     month = today.month
     
-    # 🔧 修正: 新しいカレンダー生成関数を使用
-    calendar_days = generate_calendar_days(year, month)
+    # カレンダーは記録が変わるまで描画済みのHTMLを使い回す
+    def render_calendar():
+        # 🔧 修正: 新しいカレンダー生成関数を使用
+        calendar_days = generate_calendar_days(year, month)
+        
+        # デバッグ用: カレンダーデータをログに出力（DEBUGが有効なときだけ組み立てる）
+        log = get_route_logger()
+        if log.isEnabledFor(logging.DEBUG):
+            lines = []
+            for i, day in enumerate(calendar_days[:10]):  # 最初の10日だけ表示
+                padding = "（前/次月）" if day['is_padding'] else ""
+                today_mark = "【今日】" if day['is_today'] else ""
+                record_mark = "✓" if day['has_record'] else ""
+                lines.append(f"  {i:2d}: {day['full_date']} ({day['day_name']}) {day['day']:2d}日"
+                             f"{padding}{today_mark}{record_mark}")
+            log.debug("カレンダーデータ生成: %d日 (%d年%d月)\n%s", len(calendar_days), year, month, '\n'.join(lines))
+        
+        return render_template('_calendar.html', calendar={'year': year, 'month': month},
+                               calendar_days=calendar_days)
+    
+    calendar_html = render_fragment('calendar', render_calendar, today.date().isoformat())
     
     # ユーザーのカスタム科目リスト
     custom_subjects = get_user_custom_subjects(current_user.id)
@@ -417,23 +2662,58 @@ def dashboard():
     # ユーザーのアバター画像URL
     avatar_path = AVATAR_OPTIONS.get(current_user.avatar, AVATAR_OPTIONS['default_cat'])
     
-    # デバッグ用: カレンダーデータをコンソールに表示
-    print(f"📊 カレンダーデータ生成: {len(calendar_days)}日")
-    print(f"📅 {year}年{month}月")
-    for i, day in enumerate(calendar_days[:10]):  # 最初の10日だけ表示
-        padding = "（前/次月）" if day['is_padding'] else ""
-        today_mark = "【今日】" if day['is_today'] else ""
-        record_mark = "✓" if day['has_record'] else ""
-        print(f"  {i:2d}: {day['full_date']} ({day['day_name']}) {day['day']:2d}日{padding}{today_mark}{record_mark}")
+    # 教科別の学習状況
+    subject_stats = dummy_store.get_subject_stats(current_user.id)
+    
+    # 連続学習日数
+    current_streak, longest_streak = dummy_store.get_streaks(current_user.id)
     
     return render_template('dashboard.html',
                          user=current_user,
                          custom_subjects=custom_subjects,
-                         calendar={'year': year, 'month': month},
-                         calendar_days=calendar_days,
+                         calendar_html=calendar_html,
+                         subject_stats=subject_stats,
+                         current_streak=current_streak,
+                         longest_streak=longest_streak,
                          avatar_path=avatar_path)
 
-@app.route('/add_record', methods=['POST'])
+@route('/subject_stats.json')
+@login_required
+def subject_stats():
+    """教科別の学習状況をJSONで返す"""
+    return jsonify({'subjects': dummy_store.get_subject_stats(current_user.id)})
+
+@route('/activity_heatmap.json')
+@login_required
+def activity_heatmap():
+    """直近12か月の日別学習量をJSONで返す（ヒートマップ用）"""
+    months = max(1, min(request.args.get('months', 12, type=int), 24))
+    today = date.today()
+    
+    # 表示開始日（monthsか月前の翌月1日）
+    start_month = today.month - months + 1
+    start_year = today.year + (start_month - 1) // 12
+    start_month = (start_month - 1) % 12 + 1
+    start_date = date(start_year, start_month, 1)
+    activity = dummy_store.get_daily_activity_range(current_user.id, start_date, today)
+    
+    days = []
+    for ordinal in range(start_date.toordinal(), today.toordinal() + 1):
+        day_date = date.fromordinal(ordinal)
+        record_count, study_minutes = activity.get(ordinal, (0, 0))
+        days.append({
+            'date': day_date.isoformat(),
+            'count': record_count,
+            'minutes': study_minutes,
+        })
+    
+    return jsonify({
+        'start': days[0]['date'],
+        'end': days[-1]['date'],
+        'days': days,
+    })
+
+@route('/add_record', methods=['POST'])
 @login_required
 def add_record():
     subject = request.form.get('study_subject', '').strip()
@@ -442,7 +2722,7 @@ def add_record():
     learning_time = int(request.form.get('study_time_minutes', 30))
     study_date_str = request.form.get('study_date', '')
     
-    print(f"🔍 学習記録追加: subject={subject}, content={content}, time={learning_time}分")
+    get_route_logger().debug("学習記録追加: subject=%s, content=%s, time=%d分", subject, content, learning_time)
     
     if not subject or not content:
         flash('科目と学習内容は必須です', 'error')
@@ -463,44 +2743,197 @@ def add_record():
         subject,
         content,
         difficulty,
-        learning_time
+        learning_time,
+        study_date
     )
-    new_record.study_date = study_date.strftime('%Y-%m-%d')
     
     # XP計算とレベルアップチェック
-    base_xp = learning_time * 0.5
-    difficulty_bonus = difficulty * 5
-    total_xp = int(base_xp + difficulty_bonus)
+    total_xp = xp_for_record(learning_time, difficulty)
     
     level_up_occurred = add_xp_and_check_level_up(current_user, total_xp, f"{subject}の学習")
     
     # ユーザーの記録数を更新
-    current_user.records_count = len(dummy_store.get_user_records(current_user.id))
+    current_user.records_count = dummy_store.count_user_records(current_user.id)
+    dummy_store.save_user(current_user)
     
     flash(f'学習記録を追加しました！ (+{total_xp}XP)', 'success')
     return redirect(url_for('dashboard'))
 
-@app.route('/records')
+@route('/import_records', methods=['POST'])
+@login_required
+def import_records():
+    """CSV・JSONLの学習記録を読み込みながら、まとめて追加（Accept: application/json なら結果をJSONで返す）"""
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        flash('ファイルを選択してください', 'error')
+        return redirect(url_for('settings'))
+    
+    fmt = request.form.get('format') or (
+        'jsonl' if upload.filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        flash('CSVまたはJSONLのファイルを選択してください', 'error')
+        return redirect(url_for('settings'))
+    
+    summary = import_record_rows(current_user, iter_import_rows(upload.stream, fmt))
+    get_route_logger().info("インポート: user_id=%s, imported=%d, skipped=%d",
+                            current_user.id, summary['imported'], summary['skipped'])
+    
+    current_user.records_count = dummy_store.count_user_records(current_user.id)
+    dummy_store.save_user(current_user)
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(summary)
+    if summary['skipped']:
+        flash(f"{summary['imported']}件をインポートしました（{summary['skipped']}件は読み込めませんでした）", 'warning')
+    else:
+        flash(f"{summary['imported']}件をインポートしました！ (+{summary['xp']}XP)", 'success')
+    return redirect(url_for('records'))
+
+@route('/export_records')
+@login_required
+def export_records():
+    """全ての学習記録をCSV・JSONLで少しずつ送信（履歴の長さによらずメモリ使用量は一定）"""
+    fmt = request.args.get('format', 'csv')
+    if fmt == 'csv':
+        body, mimetype = iter_export_csv, 'text/csv'
+    elif fmt == 'jsonl':
+        body, mimetype = iter_export_jsonl, 'application/x-ndjson'
+    else:
+        return "対応していない形式です", 400
+    
+    records = dummy_store.iter_newest_records(current_user.id)
+    response = Response(stream_with_context(body(records)), mimetype=mimetype)
+    filename = f"study_records_{date.today():%Y%m%d}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@route('/sync_records', methods=['POST'])
+@login_required
+def sync_records():
+    """オフラインで溜めた記録をJSONでまとめて受け取り、冪等キーで再送を除いて1回で適用"""
+    payload = request.get_json(silent=True)
+    items = payload.get('records') if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return jsonify({'error': '{"records": [...]} の形式で送信してください'}), 400
+    if len(items) > SYNC_MAX_RECORDS:
+        return jsonify({'error': f"1回に送信できる記録は{SYNC_MAX_RECORDS}件までです"}), 413
+    
+    results = []
+    keyed_rows = []
+    for item in items:
+        key = item.get('idempotency_key') if isinstance(item, dict) else None
+        result = {'idempotency_key': key}
+        results.append(result)
+        if not isinstance(key, str) or not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            result.update(status='invalid', error=f"idempotency_key は{IDEMPOTENCY_KEY_MAX_LENGTH}文字以内の文字列です")
+            continue
+        try:
+            keyed_rows.append((key, parse_import_row(item)))
+        except (TypeError, ValueError) as e:
+            result.update(status='invalid', error=str(e))
+    
+    created, duplicates, (old_level, new_level, new_xp) = dummy_store.sync_records(
+        current_user.id, keyed_rows, "オフライン記録の同期")
+    
+    # 同じバッチ内で同じキーが2回あれば2回目は重複扱い
+    reported = set()
+    for result in results:
+        key = result['idempotency_key']
+        if 'status' in result:
+            continue
+        if key in created and key not in reported:
+            result.update(status='created', record_id=created[key].id)
+            reported.add(key)
+        else:
+            result.update(status='duplicate', record_id=duplicates[key] if key in duplicates else created[key].id)
+    
+    current_user.level = new_level
+    current_user.xp = new_xp
+    current_user.total_xp = total_xp_for_level(new_level) + new_xp
+    current_user.records_count = dummy_store.count_user_records(current_user.id)
+    
+    return jsonify({
+        'results': results,
+        'created': len(created),
+        'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+        'invalid': sum(1 for result in results if result['status'] == 'invalid'),
+        'xp_gained': sum(xp_for_record(record.learning_time, record.difficulty) for record in created.values()),
+        'level_up': new_level > old_level,
+        'level': new_level,
+        'xp': new_xp,
+        'xp_to_next': current_user.xp_to_next,
+        'total_xp': current_user.total_xp,
+        'records_count': current_user.records_count,
+    })
+
+@route('/records')
 @login_required
+@conditional_page
 def records():
-    # ユーザーの全ての学習記録を取得
-    user_records = dummy_store.get_user_records(current_user.id)
+    cursor, per_page = get_records_page_args()
     
-    # 日付でソート（新しい順）
-    user_records.sort(key=lambda x: x.study_date, reverse=True)
+    # 学習記録を1ページ分だけ取得（ストア側で整列済みなので新しい順に読むだけ）
+    user_records, next_cursor = dummy_store.get_records_page(current_user.id, cursor, per_page)
     
-    # 未復習のポイントを抽出
-    unmastered_points = [record for record in user_records if not record.is_mastered]
+    # 未復習のポイントを復習期限が早い順に取得（表示はページサイズまで）
+    unmastered_points = dummy_store.get_due_reviews(current_user.id, per_page)
+    unmastered_count = dummy_store.count_unmastered_records(current_user.id)
     
     # ユーザーのカスタム科目リスト
     custom_subjects = get_user_custom_subjects(current_user.id)
     
-    return render_template('records.html',
-                         records=user_records,
-                         unmastered_points=unmastered_points,
-                         custom_subjects=custom_subjects)
+    context = dict(next_cursor=encode_records_cursor(next_cursor),
+                   total_records=dummy_store.count_user_records(current_user.id),
+                   unmastered_points=unmastered_points,
+                   unmastered_count=unmastered_count,
+                   custom_subjects=custom_subjects)
+    
+    if RECORDS_STREAMING or request.args.get('stream') == '1':
+        # ヘッダーと最初の記録から順に送信する（一覧は先に描画せず、テンプレートの中で描画する）
+        context.update(records_html=None, records=user_records)
+        current_app.update_template_context(context)
+        stream = current_app.jinja_env.get_template('records.html').stream(context)
+        stream.enable_buffering(8)
+        return Response(stream_with_context(stream), mimetype='text/html')
+    
+    # 記録一覧は記録が変わるまで描画済みのHTMLを使い回す
+    context['records_html'] = render_fragment(
+        'records', lambda: render_template('_records_list.html', records=user_records),
+        encode_records_cursor(cursor), per_page)
+    return render_template('records.html', **context)
+
+@route('/records.json')
+@login_required
+def records_json():
+    """記録一覧の続きをJSONで返す（無限スクロール用）"""
+    cursor, per_page = get_records_page_args()
+    user_records, next_cursor = dummy_store.get_records_page(current_user.id, cursor, per_page)
+    
+    return jsonify({
+        'records': [record_to_dict(record) for record in user_records],
+        'html': ''.join(render_template('_record_card.html', record=record) for record in user_records),
+        'next_cursor': encode_records_cursor(next_cursor),
+    })
+
+@route('/search_records.json')
+@login_required
+def search_records_json():
+    """学習記録を全文検索し、関連度順の結果をページ単位でJSONで返す"""
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    offset = (page - 1) * SEARCH_RESULTS_PER_PAGE
+    user_records, total = dummy_store.search_records(current_user.id, query, offset, SEARCH_RESULTS_PER_PAGE)
+    
+    return jsonify({
+        'query': query,
+        'records': [record_to_dict(record) for record in user_records],
+        'html': ''.join(render_template('_record_card.html', record=record) for record in user_records),
+        'total': total,
+        'page': page,
+        'has_next': offset + len(user_records) < total,
+    })
 
-@app.route('/toggle_mastery/<int:record_id>')
+@route('/toggle_mastery/<int:record_id>')
 @login_required
 def toggle_mastery(record_id):
     record = dummy_store.toggle_mastery(current_user.id, record_id)
@@ -519,7 +2952,22 @@ def toggle_mastery(record_id):
     
     return redirect(url_for('records'))
 
-@app.route('/delete_record/<int:record_id>')
+@route('/complete_review/<int:record_id>')
+@login_required
+def complete_review(record_id):
+    """復習リストの「復習完了」: 復習済みにして、SM-2の間隔で次の復習期限を決める"""
+    record = dummy_store.complete_review(current_user.id, record_id)
+    
+    if not record:
+        flash('記録が見つからないか、まだ復習期限ではありません', 'error')
+        return redirect(url_for('records'))
+    
+    review_xp = record.learning_time * 0.2
+    add_xp_and_check_level_up(current_user, int(review_xp), "復習完了")
+    flash(f'復習完了！ 次の復習は {record.due_date} です', 'success')
+    return redirect(url_for('records'))
+
+@route('/delete_record/<int:record_id>')
 @login_required
 def delete_record(record_id):
     success = dummy_store.delete_record(current_user.id, record_id)
@@ -531,8 +2979,9 @@ def delete_record(record_id):
     
     return redirect(url_for('records'))
 
-@app.route('/settings')
+@route('/settings')
 @login_required
+@conditional_page
 def settings():
     # ユーザーのカスタム科目リスト
     custom_subjects = get_user_custom_subjects(current_user.id)
@@ -546,7 +2995,7 @@ def settings():
                          current_avatar=current_avatar,
                          avatar_options=AVATAR_OPTIONS)
 
-@app.route('/update_avatar', methods=['POST'])
+@route('/update_avatar', methods=['POST'])
 @login_required
 def update_avatar():
     avatar_id = request.form.get('avatar_id', 'default_cat')
@@ -555,11 +3004,12 @@ def update_avatar():
         flash('無効なアバターIDです', 'error')
     else:
         current_user.avatar = avatar_id
+        dummy_store.save_user(current_user)
         flash('アバターを更新しました！', 'success')
     
     return redirect(url_for('settings'))
 
-@app.route('/update_username', methods=['POST'])
+@route('/update_username', methods=['POST'])
 @login_required
 def update_username():
     new_username = request.form.get('username', '').strip()
@@ -569,11 +3019,11 @@ def update_username():
         return redirect(url_for('settings'))
     
     # 既存ユーザーチェック（自分自身を除く）
-    existing_user = dummy_store.get_user_by_username(new_username)
+    existing_user = dummy_store.get_user_by_username(new_username, case_insensitive=USERNAME_CASE_INSENSITIVE)
     if existing_user and existing_user.id != current_user.id:
         flash('このユーザー名は既に使用されています', 'error')
     else:
-        current_user.username = new_username
+        dummy_store.rename_user(current_user.id, new_username)
         flash('ユーザー名を更新しました！', 'success')
     
     return redirect(url_for('settings'))
@@ -582,7 +3032,7 @@ def update_username():
 # 教科管理エンドポイント
 # ========================
 
-@app.route('/add_subject', methods=['POST'])
+@route('/add_subject', methods=['POST'])
 @login_required
 def add_subject():
     """新しい教科を追加"""
@@ -592,11 +3042,8 @@ def add_subject():
         flash('教科名を入力してください', 'error')
         return redirect(url_for('settings'))
     
-    # 既存の教科リストを取得
-    custom_subjects = get_user_custom_subjects(current_user.id)
-    
     # バリデーション
-    if new_subject in custom_subjects:
+    if dummy_store.has_user_subject(current_user.id, new_subject):
         flash('この教科は既に登録されています', 'error')
         return redirect(url_for('settings'))
     
@@ -605,7 +3052,7 @@ def add_subject():
         return redirect(url_for('settings'))
     
     # 現在のカスタム教科数を取得（基本教科は含めない）
-    user_custom_count = len(dummy_store.subjects.get(current_user.id, []))
+    user_custom_count = dummy_store.count_custom_subjects(current_user.id)
     
     # カスタム教科の最大数は10個
     if user_custom_count >= 10:
@@ -620,7 +3067,7 @@ def add_subject():
     
     return redirect(url_for('settings'))
 
-@app.route('/delete_subject', methods=['POST'])
+@route('/delete_subject', methods=['POST'])
 @login_required
 def delete_subject():
     """教科を削除"""
@@ -645,7 +3092,7 @@ def delete_subject():
     
     return redirect(url_for('settings'))
 
-@app.route('/restore_subject', methods=['POST'])
+@route('/restore_subject', methods=['POST'])
 @login_required
 def restore_subject():
     """削除された基本教科を復元"""
@@ -661,49 +3108,37 @@ def restore_subject():
         return redirect(url_for('settings'))
     
     # 非表示リストから削除して復元
-    if hasattr(dummy_store, 'hidden_subjects') and current_user.id in dummy_store.hidden_subjects:
-        if subject_to_restore in dummy_store.hidden_subjects[current_user.id]:
-            dummy_store.hidden_subjects[current_user.id].remove(subject_to_restore)
-            flash(f'「{subject_to_restore}」を基本教科に復元しました', 'success')
-        else:
-            flash('この教科は削除されていません', 'error')
+    if dummy_store.restore_user_subject(current_user.id, subject_to_restore):
+        flash(f'「{subject_to_restore}」を基本教科に復元しました', 'success')
     else:
         flash('この教科は削除されていません', 'error')
     
     return redirect(url_for('settings'))
 
-@app.route('/level_history')
+@route('/level_history')
 @login_required
+@conditional_page
 def level_history():
-    # ダミーレベルアップ履歴
-    dummy_history = [
-        {
-            'old_level': 1,
-            'new_level': 2,
-            'xp_earned': 150,
-            'message': '数学の学習によりレベルアップ！',
-            'timestamp': '2025-12-20 14:30:00'
-        },
-        {
-            'old_level': 2,
-            'new_level': 3,
-            'xp_earned': 200,
-            'message': '英語の復習によりレベルアップ！',
-            'timestamp': '2025-12-19 10:15:00'
-        }
-    ]
+    page = max(request.args.get('page', 1, type=int), 1)
+    offset = (page - 1) * LEVEL_HISTORY_PER_PAGE
+    
+    # レベルアップ履歴（XP履歴から1ページ分だけ取得）
+    events, history_count = dummy_store.get_level_history(current_user.id, offset, LEVEL_HISTORY_PER_PAGE)
     
-    # 統計情報
-    total_level_ups = len(dummy_history)
-    total_xp_earned = sum([h['xp_earned'] for h in dummy_history])
+    # 統計情報（累計値を保持しているので集計不要）
+    total_level_ups, total_xp_earned = dummy_store.get_xp_stats(current_user.id)
     
     return render_template('level_history.html',
-                         level_history=dummy_history,
+                         level_history=[xp_event_to_dict(event) for event in events],
+                         level_history_count=history_count,
+                         page=page,
+                         has_prev=page > 1,
+                         has_next=offset + LEVEL_HISTORY_PER_PAGE < history_count,
                          current_level=current_user.level,
                          total_level_ups=total_level_ups,
                          total_xp_earned=total_xp_earned)
 
-@app.route('/friends')
+@route('/friends')
 @login_required
 def friends():
     # ダミーのフレンドデータ
@@ -719,7 +3154,7 @@ def friends():
                          friends=dummy_friends,
                          avatar_options=AVATAR_OPTIONS)
 
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -730,12 +3165,11 @@ def logout():
 # 共有機能エンドポイント（ダミー版）
 # ========================
 
-@app.route('/share/<int:record_id>')
+@route('/share/<int:record_id>')
 @login_required
 def share_single(record_id):
     """単一の学習記録を共有するページ（ダミー）"""
-    user_records = dummy_store.get_user_records(current_user.id)
-    record = next((r for r in user_records if r.id == record_id), None)
+    record = dummy_store.get_record(current_user.id, record_id)
     
     if not record:
         flash("記録が見つかりません", "error")
@@ -750,30 +3184,42 @@ def share_single(record_id):
                          share_url=share_url,
                          AVATAR_OPTIONS=AVATAR_OPTIONS)
 
-@app.route('/shared/<int:record_id>')
+@route('/shared/<int:record_id>')
 def shared_record(record_id):
-    """公開用の学習記録表示ページ（ログイン不要、ダミー）"""
-    # ダミーデータから適当な記録を取得
-    dummy_user = dummy_store.get_user_by_id(1)  # testユーザー
-    user_records = dummy_store.get_user_records(1)
-    record = user_records[0] if user_records else None
-    
-    if not record:
+    """公開用の学習記録表示ページ（ログイン不要、リンクのプレビュー等で何度も読まれるのでHTMLをキャッシュ）"""
+    cache = current_app.extensions['shared_page_cache']
+    owner_id = dummy_store.get_record_owner(record_id)
+    if owner_id is None:
         return "記録が見つかりません", 404
     
-    return render_template('share_single.html',
-                         user=dummy_user,
-                         record=record,
-                         share_url=request.url,
-                         AVATAR_OPTIONS=AVATAR_OPTIONS,
-                         is_public=True)
+    # 持ち主のデータ版数をキーに含めるので、別のワーカーで記録やプロフィールが変わっても古いHTMLは使われない
+    cache_key = (record_id, dummy_store.get_data_version(owner_id))
+    html = cache.get(cache_key)
+    
+    if html is None:
+        record = dummy_store.get_record(owner_id, record_id)
+        
+        if not record:
+            return "記録が見つかりません", 404
+        
+        html = render_template('share_single.html',
+                               user=dummy_store.get_user_by_id(owner_id),
+                               record=record,
+                               share_url=url_for('shared_record', record_id=record_id, _external=True),
+                               AVATAR_OPTIONS=AVATAR_OPTIONS,
+                               is_public=True)
+        cache.set(cache_key, html)
+    
+    response = Response(html, mimetype='text/html')
+    response.cache_control.public = True
+    response.cache_control.max_age = cache.ttl
+    return response
 
-@app.route('/share/<int:record_id>/image')
+@route('/share/<int:record_id>/image')
 @login_required
 def share_single_image(record_id):
     """学習記録を画像として共有するページ（ダミー）"""
-    user_records = dummy_store.get_user_records(current_user.id)
-    record = next((r for r in user_records if r.id == record_id), None)
+    record = dummy_store.get_record(current_user.id, record_id)
     
     if not record:
         flash("記録が見つかりません", "error")
@@ -788,14 +3234,14 @@ def share_single_image(record_id):
                          current_date=current_date,
                          AVATAR_OPTIONS=AVATAR_OPTIONS)
 
-@app.route('/share/<int:record_id>/qr')
+@route('/share/<int:record_id>/qr')
 @login_required
 def share_single_qr(record_id):
     """学習記録のQRコードを生成（ダミー）"""
     flash("QRコード機能は近日実装予定です", "info")
     return redirect(url_for('share_single', record_id=record_id))
 
-@app.route('/debug/create_test_data')
+@route('/debug/create_test_data')
 def create_test_data():
     """デバッグ用: テストデータを作成"""
     if not current_user.is_authenticated:
@@ -816,7 +3262,7 @@ def create_test_data():
     flash('テストデータを作成しました', 'success')
     return redirect(url_for('dashboard'))
 
-@app.route('/debug/reset_user')
+@route('/debug/reset_user')
 def debug_reset_user():
     """デバッグ用: ユーザーデータをリセット"""
     if not DEBUG_MODE:
@@ -826,7 +3272,25 @@ def debug_reset_user():
     flash('ユーザーデータをリセットしました', 'info')
     return redirect(url_for('login'))
 
-@app.route('/debug/calendar_data')
+@route('/debug/fragment_cache')
+@login_required
+def debug_fragment_cache():
+    """デバッグ用: 断片キャッシュのヒット・ミス数（キャッシュサイズの調整用）"""
+    return jsonify(get_fragment_cache().stats())
+
+@route('/metrics')
+def metrics():
+    """計測値（Prometheusのテキスト形式）: METRICS_TOKEN をBearerトークンで送ってきたときのみ"""
+    registry = current_app.extensions.get('metrics')
+    token = current_app.config['METRICS_TOKEN']
+    if registry is None or not token:
+        return "Not Found", 404
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(credentials.encode(), token.encode()):
+        return "Not Found", 404
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@route('/debug/calendar_data')
 @login_required
 def debug_calendar_data():
     """デバッグ用: カレンダーデータを表示"""
@@ -854,6 +3318,78 @@ def debug_calendar_data():
     
     return f"<pre>{output}</pre>"
 
+# ========================
+# アプリケーション作成
+# ========================
+
+def asset_version(app):
+    """アプリ本体とテンプレートの最終更新時刻（デプロイのたびにETagが変わるように）"""
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [os.path.abspath(__file__)] + [os.path.join(template_dir, name) for name in os.listdir(template_dir)]
+    return str(max(os.stat(path).st_mtime_ns for path in paths))
+
+def compile_templates(app):
+    """templates/ の全テンプレートを読み込んでバイトコードキャッシュを作成"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+def create_app(config=None):
+    """アプリケーションを作成（データストアと初期データは最初に使うときに作成）"""
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    if config:
+        app.config.update(config)
+    
+    login_manager.init_app(app)
+    configure_logging(app.config)
+    if app.config['METRICS_ENABLED']:
+        install_metrics(app)
+    app.extensions['fragment_cache'] = FragmentCache(app.config['FRAGMENT_CACHE_MAX_BYTES'])
+    
+    @app.teardown_appcontext
+    def release_data_store_connection(exc):
+        # ワーカースレッドが入れ替わっても接続が溜まらないよう、使い終わった接続を返す
+        store = app.extensions.get('data_store')
+        if store is not None:
+            store.release_connection()
+    
+    app.extensions['shared_page_cache'] = TtlCache(app.config['SHARED_PAGE_CACHE_SIZE'],
+                                                   app.config['SHARED_PAGE_CACHE_TTL'])
+    if app.config['ETAG_SALT'] is None:
+        app.config['ETAG_SALT'] = asset_version(app)
+    
+    cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if cache_dir:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        except OSError as e:
+            logger.warning("テンプレートキャッシュを無効化: %s", e)
+    
+    for rule, options, view_func in _routes:
+        app.add_url_rule(rule, view_func=view_func, **options)
+    
+    @app.cli.command('compile-templates')
+    def compile_templates_command():
+        """テンプレートを事前にコンパイルしてキャッシュに保存"""
+        names = compile_templates(app)
+        print(f"✅ {len(names)}個のテンプレートをコンパイルしました")
+    
+    return app
+
+_app_lock = threading.Lock()
+
+def __getattr__(name):
+    """`from app_render import app` のときだけ既定設定のアプリを作成"""
+    if name == 'app':
+        with _app_lock:
+            if 'app' not in globals():
+                globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # ========================
 # メイン実行部分
 # ========================
@@ -869,11 +3405,8 @@ def init_debug_mode():
     print("  • 任意のユーザー名でログイン可能")
     print("=" * 50)
     
-    # デフォルトユーザーを作成
-    dummy_store.add_user('test', 'test123', level=5, xp=350, avatar='cat')
-    dummy_store.add_user('admin', 'debug123', level=1, xp=0, avatar='default_cat')
-    
-    print("✅ デフォルトユーザーを作成:")
+    # デフォルトユーザーはデータストア作成時に作られる
+    print("✅ デフォルトユーザー:")
     print(f"  1. test / test123 (レベル5, 350XP)")
     print(f"  2. admin / debug123 (レベル1, 0XP)")
     print("=" * 50)
@@ -881,6 +3414,7 @@ def init_debug_mode():
 if __name__ == '__main__':
     # デバッグモードを初期化
     init_debug_mode()
+    app = create_app()
     
     # 開発サーバー起動
     print("🚀 Flaskサーバーを起動中...")
@@ -0,0 +1,74 @@
+"""データストアのベンチマーク（メモリ内 vs SQLite）
+
+同じ操作列を DummyDataStore と SqliteDataStore に対して実行し、
+1操作あたりの所要時間を比較する。
+
+実行: python benchmarks/bench_data_store.py [記録数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import DummyDataStore, SqliteDataStore  # noqa: E402
+
+N_RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+N_OPS = 2_000
+SUBJECTS = ['数学', '英語', '国語', '理科', '社会', 'プログラミング']
+
+
+def timed(label, func, n):
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    elapsed = time.perf_counter() - start
+    return label, elapsed / n * 1e6
+
+
+def run(store):
+    user_id = store.get_user_by_username('test').id
+    start_date = date.today() - timedelta(days=3 * 365)
+    results = []
+    
+    record_ids = []
+    
+    def add(i):
+        record = store.add_record(user_id, SUBJECTS[i % len(SUBJECTS)], f"内容 {i}",
+                                  difficulty=i % 5 + 1, learning_time=30,
+                                  study_date=start_date + timedelta(days=random.randint(0, 3 * 365)))
+        record_ids.append(record.id)
+    
+    results.append(timed('add_record', add, N_RECORDS))
+    results.append(timed('get_record', lambda i: store.get_record(user_id, random.choice(record_ids)), N_OPS))
+    results.append(timed('toggle_mastery', lambda i: store.toggle_mastery(user_id, random.choice(record_ids)), N_OPS))
+    results.append(timed('get_records_page', lambda i: store.get_records_page(user_id, None, 50), N_OPS))
+    results.append(timed('get_daily_activity', lambda i: store.get_daily_activity(
+        user_id, start_date + timedelta(days=i % 1000)), N_OPS))
+    results.append(timed('get_daily_activity_range', lambda i: store.get_daily_activity_range(
+        user_id, start_date + timedelta(days=i % 700), start_date + timedelta(days=i % 700 + 365)), N_OPS))
+    results.append(timed('get_user_by_username', lambda i: store.get_user_by_username('test'), N_OPS))
+    
+    random.shuffle(record_ids)
+    # 記録数が操作回数より少ないときは、全件を消した時点で止める
+    victims = record_ids[:min(N_OPS, len(record_ids))]
+    results.append(timed('delete_record', lambda i: store.delete_record(user_id, victims[i]), len(victims)))
+    return results
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    memory_results = run(DummyDataStore())
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = SqliteDataStore(os.path.join(tmpdir, 'bench.db'))
+        sqlite_results = run(store)
+        store.close()
+    
+    print(f"records: {N_RECORDS:,}")
+    print(f"{'operation':<26} {'memory(us)':>12} {'sqlite(us)':>12}")
+    for (label, memory_us), (_, sqlite_us) in zip(memory_results, sqlite_results):
+        print(f"{label:<26} {memory_us:>12.1f} {sqlite_us:>12.1f}")
@@ -0,0 +1,107 @@
+"""一括インポート・ストリーミングエクスポートのベンチマーク
+
+1. 同じN件の記録を /add_record に1件ずつPOSTした場合と、CSVにして
+   /import_records で1回でアップロードした場合の所要時間を比べる
+2. 記録数を変えて /export_records を読み切り、tracemallocで測った
+   メモリ使用量のピークが記録数に比例しないことを確かめる
+
+実行: python benchmarks/bench_import.py [記録数]
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import create_app, get_data_store  # noqa: E402
+
+N_RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+EXPORT_SIZES = [10_000, 50_000]
+SUBJECTS = ['数学', '英語', '国語', '理科', '社会']
+
+
+def make_rows(n):
+    today = date.today()
+    return [{'study_date': (today - timedelta(days=i % 365)).isoformat(), 'subject': SUBJECTS[i % len(SUBJECTS)],
+             'content': f"内容 {i}", 'difficulty': i % 5 + 1, 'learning_time': 30} for i in range(n)]
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def logged_in_client(config, username):
+    """ログイン直後のCookieだけを送るクライアント（フラッシュメッセージでCookieが肥大しないように）"""
+    app = create_app({'LOG_LEVEL': 'CRITICAL', 'METRICS_ENABLED': False, **config})
+    client = app.test_client(use_cookies=False)
+    response = client.post('/login', data={'username': username, 'password': 'password'})
+    headers = {'Cookie': response.headers['Set-Cookie'].split(';', 1)[0]}
+    return app, client, headers
+
+
+def time_one_by_one(config, rows):
+    _, client, headers = logged_in_client(config, 'one_by_one')
+    start = time.perf_counter()
+    for row in rows:
+        client.post('/add_record', data={'study_subject': row['subject'], 'study_content': row['content'],
+                                         'study_difficulty': row['difficulty'],
+                                         'study_time_minutes': row['learning_time'],
+                                         'study_date': row['study_date']}, headers=headers)
+    return time.perf_counter() - start
+
+
+def time_import(config, rows):
+    _, client, headers = logged_in_client(config, 'bulk')
+    payload = to_csv(rows)
+    start = time.perf_counter()
+    response = client.post('/import_records', data={'file': (io.BytesIO(payload), 'records.csv')},
+                           headers={**headers, 'Accept': 'application/json'})
+    elapsed = time.perf_counter() - start
+    assert response.json['imported'] == len(rows), response.json
+    return elapsed
+
+
+def export_peak(config, n):
+    app, client, headers = logged_in_client(config, 'exporter')
+    with app.app_context():
+        store = get_data_store()
+        user_id = store.get_user_by_username('exporter').id
+        rows = make_rows(n)
+        store.add_records(user_id, [(r['subject'], r['content'], r['difficulty'], r['learning_time'],
+                                     date.fromisoformat(r['study_date'])) for r in rows])
+    tracemalloc.start()
+    response = client.get('/export_records?format=csv', headers=headers, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
+
+if __name__ == '__main__':
+    rows = make_rows(N_RECORDS)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        configs = {
+            'memory': {'DATA_STORE': 'memory'},
+            'sqlite': {'DATA_STORE': 'sqlite', 'SQLITE_PATH': os.path.join(tmpdir, 'bench.db')},
+        }
+        print(f"records: {N_RECORDS:,}")
+        print(f"{'store':<8} {'add_record x N(s)':>18} {'import(s)':>10} {'speedup':>8}")
+        for name, config in configs.items():
+            one = time_one_by_one(config, rows)
+            bulk = time_import(config, rows)
+            print(f"{name:<8} {one:>18.2f} {bulk:>10.2f} {one / bulk:>7.1f}x")
+        
+        print(f"\n{'store':<8} {'records':>8} {'csv bytes':>12} {'peak memory':>12}")
+        for name, config in configs.items():
+            for n in EXPORT_SIZES:
+                size, peak = export_peak(config, n)
+                print(f"{name:<8} {n:>8,} {size:>12,} {peak:>12,}")
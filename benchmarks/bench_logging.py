@@ -0,0 +1,58 @@
+"""ログ出力のオーバーヘッドのベンチマーク
+
+同じリクエスト列を、ログを無効にしたアプリ・QueueListener で別スレッドから
+書き出すアプリ・リクエスト処理中に直接書き出すアプリで実行し、
+1リクエストあたりの所要時間を比較する。全てのDEBUGログを出す設定
+（LOG_DEBUG_SAMPLE_RATE=1.0）で、出力先は os.devnull。
+
+実行: python benchmarks/bench_logging.py [リクエスト数]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import create_app  # noqa: E402
+
+N_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+
+MODES = {
+    'off': {'LOG_LEVEL': 'CRITICAL'},
+    'async (queue)': {'LOG_LEVEL': 'DEBUG', 'LOG_ASYNC': True},
+    'sync': {'LOG_LEVEL': 'DEBUG', 'LOG_ASYNC': False},
+}
+
+
+def run(mode_config):
+    app = create_app({
+        'LOG_FILE': os.devnull,
+        'LOG_DEBUG_SAMPLE_RATE': 1.0,
+        # カレンダーのDEBUGログは描画するときだけ出るので断片キャッシュは無効にする
+        'FRAGMENT_CACHE_MAX_BYTES': 0,
+        **mode_config,
+    })
+    client = app.test_client()
+    results = []
+    with app.app_context():
+        client.post('/login', data={'username': 'test', 'password': 'test123'})
+        
+        start = time.perf_counter()
+        for i in range(N_REQUESTS):
+            client.post('/add_record', data={'study_subject': '数学', 'study_content': f"内容 {i}"})
+        results.append(('POST /add_record', (time.perf_counter() - start) / N_REQUESTS * 1e6))
+        
+        start = time.perf_counter()
+        for _ in range(N_REQUESTS):
+            client.get('/dashboard')
+        results.append(('GET /dashboard', (time.perf_counter() - start) / N_REQUESTS * 1e6))
+    return results
+
+
+if __name__ == '__main__':
+    all_results = {mode: run(config) for mode, config in MODES.items()}
+    
+    print(f"requests: {N_REQUESTS:,}")
+    print(f"{'route':<18} " + ' '.join(f"{mode + '(us)':>18}" for mode in MODES))
+    for i, (label, _) in enumerate(all_results['off']):
+        print(f"{label:<18} " + ' '.join(f"{all_results[mode][i][1]:>18.1f}" for mode in MODES))
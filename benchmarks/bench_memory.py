@@ -0,0 +1,62 @@
+"""メモリ使用量のベンチマーク（学習記録1件あたりのバイト数）
+
+DummyDataStore に記録を追加し、tracemalloc で計測した増加量を記録数で割る。
+記録オブジェクト単体の大きさと、索引・集計を含むストア全体の増加量の両方を表示する。
+
+実行: python benchmarks/bench_memory.py [記録数]
+"""
+import os
+import random
+import sys
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import DummyDataStore, DummyRecord, DummyUser  # noqa: E402
+
+N_RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+N_USERS = 10_000
+SUBJECTS = ['数学', '英語', '国語', '理科', '社会', 'プログラミング']
+
+
+def measure(build, n):
+    """build() が確保したメモリ（保持されている分）を n で割る"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / n
+
+
+def build_records():
+    start_date = date.today() - timedelta(days=365)
+    return [DummyRecord(i, ''.join(SUBJECTS[i % len(SUBJECTS)]), f"内容 {i}", difficulty=i % 5 + 1,
+                        study_date=start_date + timedelta(days=i % 365))
+            for i in range(N_RECORDS)]
+
+
+def build_users():
+    return [DummyUser(i, f"user{i}") for i in range(N_USERS)]
+
+
+def build_store():
+    store = DummyDataStore(seed=False)
+    user_ids = [store.add_user(f"user{i}", password_hash='x').id for i in range(10)]
+    start_date = date.today() - timedelta(days=365)
+    for i in range(N_RECORDS):
+        # 教科名はフォームから来るたびに別の文字列オブジェクトになる
+        store.add_record(random.choice(user_ids), ''.join(SUBJECTS[i % len(SUBJECTS)]), f"内容 {i}",
+                         difficulty=i % 5 + 1, study_date=start_date + timedelta(days=random.randint(0, 365)))
+    return store
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    print(f"records: {N_RECORDS:,}")
+    print(f"{'measurement':<28} {'bytes':>10}")
+    print(f"{'DummyRecord (object only)':<28} {measure(build_records, N_RECORDS):>10.1f}")
+    print(f"{'DummyUser (object only)':<28} {measure(build_users, N_USERS):>10.1f}")
+    print(f"{'DummyDataStore per record':<28} {measure(build_store, N_RECORDS):>10.1f}")
@@ -0,0 +1,71 @@
+"""レイテンシ計測（/metrics）のオーバーヘッドのベンチマーク
+
+1. 計測を無効にしたアプリと有効にしたアプリで同じリクエスト列を交互に実行し、
+   1リクエストあたりの所要時間（各ラウンドの最小値）を比較する
+2. データストアのメソッド1回の呼び出しにかかる時間を、計測の有無で比較する
+
+実行: python benchmarks/bench_metrics.py [リクエスト数]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import DummyDataStore, InstrumentedStore, Metrics, create_app  # noqa: E402
+
+N_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+N_ROUNDS = 3
+N_CALLS = 200_000
+
+REQUESTS = [
+    ('POST /add_record', lambda client, i: client.post(
+        '/add_record', data={'study_subject': '数学', 'study_content': f"内容 {i}"})),
+    ('GET /dashboard', lambda client, i: client.get('/dashboard')),
+    ('GET /records', lambda client, i: client.get('/records')),
+]
+
+
+def logged_in_client(enabled):
+    app = create_app({'METRICS_ENABLED': enabled, 'LOG_LEVEL': 'CRITICAL'})
+    client = app.test_client()
+    with app.app_context():
+        client.post('/login', data={'username': 'test', 'password': 'test123'})
+    return app, client
+
+
+def time_requests(app, client, send):
+    with app.app_context():
+        start = time.perf_counter()
+        for i in range(N_REQUESTS):
+            send(client, i)
+        return (time.perf_counter() - start) / N_REQUESTS * 1e6
+
+
+def time_store_calls(store):
+    user = store.get_user_by_username('test')
+    start = time.perf_counter()
+    for _ in range(N_CALLS):
+        store.get_data_version(user.id)
+    return (time.perf_counter() - start) / N_CALLS * 1e9
+
+
+if __name__ == '__main__':
+    clients = {enabled: logged_in_client(enabled) for enabled in (False, True)}
+    best = {}
+    for _ in range(N_ROUNDS):
+        for label, send in REQUESTS:
+            for enabled, (app, client) in clients.items():
+                elapsed = time_requests(app, client, send)
+                best[label, enabled] = min(best.get((label, enabled), elapsed), elapsed)
+    
+    print(f"requests: {N_REQUESTS:,} x {N_ROUNDS} rounds (best round)")
+    print(f"{'route':<18} {'off(us)':>10} {'on(us)':>10} {'diff':>8}")
+    for label, _ in REQUESTS:
+        t_off, t_on = best[label, False], best[label, True]
+        print(f"{label:<18} {t_off:>10.1f} {t_on:>10.1f} {(t_on / t_off - 1) * 100:>7.1f}%")
+    
+    plain = time_store_calls(DummyDataStore())
+    timed = time_store_calls(InstrumentedStore(DummyDataStore(), Metrics()))
+    print(f"\nstore.get_data_version x {N_CALLS:,}: plain {plain:.0f} ns/call, "
+          f"instrumented {timed:.0f} ns/call (+{timed - plain:.0f} ns)")
@@ -0,0 +1,51 @@
+"""起動時間のベンチマーク
+
+新しいPythonプロセスで app_render の import、create_app()、最初のリクエスト
+（GET /login）と最初のログイン後ページ（POST /login → GET /dashboard）までの
+時間を計測する。ワーカーの起動やテストの開始にかかる時間の目安になる。
+
+実行: python benchmarks/bench_startup.py [試行回数]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+# 子プロセスで実行する計測コード
+PROBE = r'''
+import json, time
+t0 = time.perf_counter()
+import app_render
+t1 = time.perf_counter()
+app = app_render.create_app()
+t2 = time.perf_counter()
+client = app.test_client()
+client.get('/login')
+t3 = time.perf_counter()
+client.post('/login', data={'username': 'test', 'password': 'test123'})
+client.get('/dashboard')
+t4 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_request_ms': (t3 - t2) * 1000,
+    'first_login_dashboard_ms': (t4 - t3) * 1000,
+}))
+'''
+
+
+def run_once():
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    results = [run_once() for _ in range(RUNS)]
+    print(f"{'metric':<28} {'median(ms)':>12} {'min(ms)':>10}")
+    for key in results[0]:
+        values = [r[key] for r in results]
+        print(f"{key:<28} {statistics.median(values):>12.1f} {min(values):>10.1f}")
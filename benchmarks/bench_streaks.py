@@ -0,0 +1,75 @@
+"""連続学習日数（ストリーク）の検証とベンチマーク
+
+過去の日付を含むランダムな記録の追加・削除を行い、そのたびに
+get_streaks() の結果を全記録から数え直した値と突き合わせる。
+あわせて get_streaks() 1回あたりの所要時間を全件走査と比較する。
+
+実行: python benchmarks/bench_streaks.py [操作数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import DummyDataStore, SqliteDataStore, streak_runs_from_days  # noqa: E402
+
+N_OPS = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000
+N_READS = 2_000
+TODAY = date.today()
+
+
+def brute_force_streaks(store, user_id, today):
+    """全記録を走査して (現在の連続日数, 最長の連続日数) を求める"""
+    days = sorted({date.fromisoformat(r.study_date).toordinal() for r in store.get_user_records(user_id)})
+    today = today.toordinal()
+    current = longest = 0
+    for start, end in streak_runs_from_days(days):
+        longest = max(longest, end - start + 1)
+        if start <= today and end >= today - 1:
+            current = min(end, today) - start + 1
+    return current, longest
+
+
+def run(store):
+    user_id = store.add_user('streak_bench', 'password').id
+    record_ids = []
+    checks = 0
+    for i in range(N_OPS):
+        if record_ids and random.random() < 0.4:
+            store.delete_record(user_id, record_ids.pop(random.randrange(len(record_ids))))
+        else:
+            # 直近に偏らせた過去の日付（未来の日付もまれに混ぜる）
+            study_date = TODAY - timedelta(days=int(random.expovariate(1 / 20)) - random.randint(0, 2))
+            record = store.add_record(user_id, '数学', f"内容 {i}", study_date=study_date)
+            record_ids.append(record.id)
+        for today in (TODAY, TODAY + timedelta(days=1), TODAY + timedelta(days=2)):
+            assert store.get_streaks(user_id, today) == brute_force_streaks(store, user_id, today), i
+            checks += 1
+    
+    start = time.perf_counter()
+    for _ in range(N_READS):
+        store.get_streaks(user_id)
+    incremental_us = (time.perf_counter() - start) / N_READS * 1e6
+    
+    start = time.perf_counter()
+    for _ in range(N_READS // 10):
+        brute_force_streaks(store, user_id, TODAY)
+    brute_force_us = (time.perf_counter() - start) / (N_READS // 10) * 1e6
+    return checks, len(record_ids), incremental_us, brute_force_us
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    results = [('memory', run(DummyDataStore(seed=False)))]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = SqliteDataStore(os.path.join(tmpdir, 'bench.db'), seed=False)
+        results.append(('sqlite', run(store)))
+        store.close()
+    
+    print(f"{'store':<8} {'checks':>8} {'records':>8} {'get_streaks(us)':>16} {'brute force(us)':>16}")
+    for label, (checks, n_records, incremental_us, brute_force_us) in results:
+        print(f"{label:<8} {checks:>8,} {n_records:>8,} {incremental_us:>16.1f} {brute_force_us:>16.1f}")
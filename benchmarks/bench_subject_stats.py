@@ -0,0 +1,84 @@
+"""教科別集計の検証とベンチマーク
+
+ランダムな記録の追加（1件ずつ・まとめて）・削除・復習済みの切り替えを行ったあと、
+rebuild_subject_stats() で全記録から作り直した集計が、差分で更新してきた集計と
+一致することを確かめる。あわせて compute_subject_stats() の所要時間を
+NumPyあり・なしで比較する（NumPyがなければ純Pythonの結果だけを表示）。
+
+実行: python benchmarks/bench_subject_stats.py [記録数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_render  # noqa: E402
+from app_render import DummyDataStore, SqliteDataStore, compute_subject_stats, optional_numpy  # noqa: E402
+
+N_RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+SUBJECTS = ['数学', '英語', '物理', '化学', '歴史', '国語']
+TODAY = date.today()
+
+
+def random_row(i):
+    return (random.choice(SUBJECTS), f"内容 {i}", random.randint(1, 5), random.randint(5, 120),
+            TODAY - timedelta(days=random.randint(0, 365)))
+
+
+def run(store):
+    """差分で更新した集計と作り直した集計を比べ、作り直しの所要時間(ms)を返す"""
+    user_id = store.add_user('stats_bench', 'password').id
+    record_ids = [record.id for record in store.add_records(user_id, [random_row(i) for i in range(N_RECORDS // 2)])]
+    for i in range(N_RECORDS // 2):
+        if record_ids and random.random() < 0.2:
+            store.delete_record(user_id, record_ids.pop(random.randrange(len(record_ids))))
+        elif record_ids and random.random() < 0.2:
+            store.toggle_mastery(user_id, random.choice(record_ids))
+        else:
+            record_ids.append(store.add_record(user_id, *random_row(i)).id)
+    
+    incremental = store.get_subject_stats(user_id)
+    start = time.perf_counter()
+    store.rebuild_subject_stats(user_id)
+    rebuild_ms = (time.perf_counter() - start) * 1e3
+    assert store.get_subject_stats(user_id) == incremental
+    return len(record_ids), rebuild_ms
+
+
+def time_compute(records, use_numpy):
+    """compute_subject_stats() 1回あたりの所要時間(ms)"""
+    threshold = app_render.NUMPY_MIN_RECORDS
+    app_render.NUMPY_MIN_RECORDS = 0 if use_numpy else len(records) + 1
+    try:
+        compute_subject_stats(records)  # NumPyの読み込みを計測から外す
+        start = time.perf_counter()
+        for _ in range(5):
+            compute_subject_stats(records)
+        return (time.perf_counter() - start) / 5 * 1e3
+    finally:
+        app_render.NUMPY_MIN_RECORDS = threshold
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    memory_store = DummyDataStore(seed=False)
+    results = [('memory', run(memory_store))]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = SqliteDataStore(os.path.join(tmpdir, 'bench.db'), seed=False)
+        results.append(('sqlite', run(store)))
+        store.close()
+    
+    print(f"{'store':<8} {'records':>8} {'rebuild(ms)':>12}")
+    for label, (n_records, rebuild_ms) in results:
+        print(f"{label:<8} {n_records:>8,} {rebuild_ms:>12.1f}")
+    
+    records = memory_store.get_user_records(memory_store.get_user_by_username('stats_bench').id)
+    print(f"compute_subject_stats({len(records):,}件): python {time_compute(records, False):.1f} ms", end='')
+    if optional_numpy() is not None:
+        print(f", numpy {time_compute(records, True):.1f} ms")
+    else:
+        print("（NumPyなし）")
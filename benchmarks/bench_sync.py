@@ -0,0 +1,73 @@
+"""オフライン記録の一括同期（/sync_records）のベンチマーク
+
+モバイルアプリがオフライン中に溜めたN件の記録を、/add_record に1件ずつPOSTした
+場合と、/sync_records に1回でPOSTした場合の所要時間を比べる。同じバッチを
+もう一度送った場合（再送）は全件が重複として扱われ、記録もXPも増えないことを確かめる。
+
+実行: python benchmarks/bench_sync.py [記録数]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import create_app  # noqa: E402
+
+N_RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+
+def make_items(n):
+    return [{'idempotency_key': str(uuid.uuid4()), 'subject': '数学', 'content': f"オフライン {i}",
+             'difficulty': i % 5 + 1, 'learning_time': 30, 'study_date': '2026-01-01'} for i in range(n)]
+
+
+def logged_in_client(config, username):
+    """ログイン直後のCookieだけを送るクライアント（フラッシュメッセージでCookieが肥大しないように）"""
+    app = create_app({'LOG_LEVEL': 'CRITICAL', 'METRICS_ENABLED': False, **config})
+    client = app.test_client(use_cookies=False)
+    response = client.post('/login', data={'username': username, 'password': 'password'})
+    return client, {'Cookie': response.headers['Set-Cookie'].split(';', 1)[0]}
+
+
+def time_form_posts(config, items):
+    client, headers = logged_in_client(config, 'form_posts')
+    start = time.perf_counter()
+    for item in items:
+        client.post('/add_record', data={'study_subject': item['subject'], 'study_content': item['content'],
+                                         'study_difficulty': item['difficulty'],
+                                         'study_time_minutes': item['learning_time'],
+                                         'study_date': item['study_date']}, headers=headers)
+    return time.perf_counter() - start
+
+
+def time_sync(config, items):
+    client, headers = logged_in_client(config, 'sync')
+    start = time.perf_counter()
+    first = client.post('/sync_records', json={'records': items}, headers=headers).json
+    elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    replay = client.post('/sync_records', json={'records': items}, headers=headers).json
+    replay_elapsed = time.perf_counter() - start
+    assert first['created'] == len(items), first
+    assert replay['created'] == 0 and replay['duplicates'] == len(items), replay
+    assert replay['total_xp'] == first['total_xp'] and replay['records_count'] == first['records_count']
+    return elapsed, replay_elapsed
+
+
+if __name__ == '__main__':
+    items = make_items(N_RECORDS)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        configs = {
+            'memory': {'DATA_STORE': 'memory'},
+            'sqlite': {'DATA_STORE': 'sqlite', 'SQLITE_PATH': os.path.join(tmpdir, 'bench.db')},
+        }
+        print(f"records: {N_RECORDS:,}")
+        print(f"{'store':<8} {'add_record x N(s)':>18} {'sync(s)':>8} {'replay(s)':>10} {'speedup':>8}")
+        for name, config in configs.items():
+            posts = time_form_posts(config, items)
+            sync, replay = time_sync(config, items)
+            print(f"{name:<8} {posts:>18.3f} {sync:>8.3f} {replay:>10.3f} {posts / sync:>7.1f}x")
@@ -0,0 +1,56 @@
+"""ユーザー名検索のベンチマーク
+
+ユーザー数を 100 〜 1,000,000 まで増やしながら、ログイン時の
+get_user_by_username の1回あたりの所要時間を計測する。
+索引が効いていればユーザー数に関係なくほぼ一定になる。
+
+実行: python benchmarks/bench_username_lookup.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_render import DummyDataStore, DummyUser  # noqa: E402
+
+SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+LOOKUPS = 100_000
+
+
+def build_store(n_users):
+    """パスワードハッシュを省略してユーザーを大量登録したストアを作成"""
+    store = DummyDataStore()
+    for _ in range(n_users):
+        user_id = store.next_user_id
+        store.next_user_id += 1
+        user = DummyUser(user_id, f"user{user_id}")
+        user.password_hash = ''
+        store.users[user_id] = user
+        store._index_username(user)
+    return store
+
+
+def bench(n_users):
+    store = build_store(n_users)
+    names = [f"user{random.randint(3, n_users + 2)}" for _ in range(LOOKUPS)]
+    
+    start = time.perf_counter()
+    for name in names:
+        store.get_user_by_username(name)
+    exact_ns = (time.perf_counter() - start) / LOOKUPS * 1e9
+    
+    start = time.perf_counter()
+    for name in names:
+        store.get_user_by_username(name.upper(), case_insensitive=True)
+    ci_ns = (time.perf_counter() - start) / LOOKUPS * 1e9
+    
+    return exact_ns, ci_ns
+
+
+if __name__ == '__main__':
+    print(f"{'users':>10} {'exact(ns)':>12} {'case-insensitive(ns)':>22}")
+    for size in SIZES:
+        exact_ns, ci_ns = bench(size)
+        print(f"{size:>10,} {exact_ns:>12.0f} {ci_ns:>22.0f}")
@@ -0,0 +1,394 @@
+"""データ量ごとの負荷試験（Flaskテストクライアント + ローカルのgunicorn）
+
+記録数 1,000 〜 1,000,000 件の合成データ（1ユーザーあたり --records-per-user 件、
+ユーザー数は記録数に比例）を作成し、/login のあとに
+/dashboard・/add_record・/records・/toggle_mastery/<id> を順に叩き続けて、
+ルートごとの p50/p99 レイテンシとスループットをJSONで出力する。
+
+- test_client: 1プロセスからテストクライアントで --iterations 周 × --sessions ユーザー
+- gunicorn:    gunicorn.conf.py で起動したサーバーに --clients プロセスから --duration 秒
+
+データはSQLiteファイルに作成し、両方の計測で共有する（--data-dir を指定すると
+作成したファイルを残し、次回は同じ記録数・ユーザー構成なら再利用する）。
+--store memory ではテストクライアント用のデータをメモリ内ストアに別途作成する。
+
+実行例:
+    python benchmarks/load_test.py 1000 10000 100000 1000000 --output load.json
+    python benchmarks/load_test.py 1000 --targets test_client
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from http.cookies import SimpleCookie
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app_render import (DEFAULT_SUBJECTS, PASSWORD_HASH_METHOD, SqliteDataStore, create_app,  # noqa: E402
+                        get_data_store)
+
+PASSWORD = 'password'
+HISTORY_DAYS = 2 * 365
+TOGGLE_SAMPLE = 50  # ユーザーごとに /toggle_mastery で使う記録IDの数
+CONTENT_WORDS = ['微分', '積分', '関数', '文法', '単語', '読解', '実験', '年号', '配列', '再帰']
+ROUTES = ['/login', '/dashboard', '/add_record', '/records', '/toggle_mastery']
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+# ========================
+# 合成データ
+# ========================
+def generate_dataset(store, n_records, records_per_user, seed=0):
+    """n_records 件の記録を持つユーザー群を作成し、ログイン名と記録IDの見本を返す"""
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD, method=PASSWORD_HASH_METHOD)
+    today = date.today()
+    users = []
+    remaining = n_records
+    while remaining > 0:
+        user = store.add_user(f"load{len(users)}", password_hash=password_hash)
+        count = min(records_per_user, remaining)
+        record_ids = []
+        for i in range(count):
+            content = ' '.join(rng.sample(CONTENT_WORDS, 3)) + f" {i}"
+            record = store.add_record(user.id, rng.choice(DEFAULT_SUBJECTS), content,
+                                      difficulty=rng.randint(1, 5), learning_time=rng.choice((15, 30, 45, 60)),
+                                      study_date=today - timedelta(days=rng.randrange(HISTORY_DAYS)))
+            record_ids.append(record.id)
+        users.append({'username': user.username, 'record_ids': rng.sample(record_ids, min(TOGGLE_SAMPLE, count))})
+        remaining -= count
+    return users
+
+
+def prepare_sqlite_dataset(data_dir, n_records, records_per_user):
+    """SQLiteファイルにデータを作成（同じ構成のファイルが残っていれば再利用）"""
+    path = os.path.join(data_dir, f"load_{n_records}_{records_per_user}.db")
+    meta_path = path + '.json'
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return path, json.load(f), 0.0
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    start = time.perf_counter()
+    store = SqliteDataStore(path, seed=False)
+    # 作成中に落ちたらファイルごと作り直すので、コミットごとのfsyncは省く
+    store._conn().execute("PRAGMA synchronous=OFF")
+    users = generate_dataset(store, n_records, records_per_user)
+    store.close()
+    elapsed = time.perf_counter() - start
+    with open(meta_path, 'w') as f:
+        json.dump(users, f)
+    return path, users, elapsed
+
+
+# ========================
+# リクエスト送信
+# ========================
+def session_cookie(set_cookie_headers):
+    for header in set_cookie_headers:
+        cookie = SimpleCookie(header)
+        if 'session' in cookie:
+            return f"session={cookie['session'].value}"
+    return None
+
+
+class TestClientTransport:
+    """Flaskテストクライアント経由（Cookieは呼び出し側で管理する）"""
+
+    def __init__(self, app):
+        self.client = app.test_client(use_cookies=False)
+
+    def request(self, method, path, data=None, cookie=None):
+        headers = {'Cookie': cookie} if cookie else {}
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        response.close()
+        return response.status_code, response.headers.getlist('Set-Cookie')
+
+
+class HttpTransport:
+    """ローカルのHTTPサーバー経由（リダイレクトは追わない）"""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+
+    def request(self, method, path, data=None, cookie=None):
+        headers = {'Cookie': cookie} if cookie else {}
+        body = None
+        if data is not None:
+            body = urllib.parse.urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            self.conn.close()
+        return response.status, response.headers.get_all('Set-Cookie') or []
+
+
+class LoadSession:
+    """1ユーザー分の操作（ログイン後のCookieを使い続ける）"""
+
+    EXPECTED_STATUS = {'/login': 302, '/dashboard': 200, '/add_record': 302, '/records': 200,
+                       '/toggle_mastery': 302}
+
+    def __init__(self, transport, user, rng):
+        self.transport = transport
+        self.user = user
+        self.rng = rng
+        self.cookie = None
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = 0
+        self.iteration = 0
+
+    def _timed(self, route, method, path, data=None):
+        start = time.perf_counter()
+        status, set_cookies = self.transport.request(method, path, data, self.cookie)
+        self.latencies[route].append(time.perf_counter() - start)
+        if status != self.EXPECTED_STATUS[route]:
+            self.errors += 1
+        return set_cookies
+
+    def login(self):
+        set_cookies = self._timed('/login', 'POST', '/login',
+                                  {'username': self.user['username'], 'password': PASSWORD})
+        # フラッシュメッセージが溜まってCookieが大きくなり続けないよう、ログイン直後のCookieを使い続ける
+        self.cookie = session_cookie(set_cookies)
+
+    def run_iteration(self):
+        self._timed('/dashboard', 'GET', '/dashboard')
+        self._timed('/add_record', 'POST', '/add_record', {
+            'study_subject': self.rng.choice(DEFAULT_SUBJECTS),
+            'study_content': f"負荷試験 {self.iteration}",
+            'study_difficulty': self.rng.randint(1, 5),
+            'study_time_minutes': 30,
+        })
+        self._timed('/records', 'GET', '/records')
+        record_id = self.rng.choice(self.user['record_ids'])
+        self._timed('/toggle_mastery', 'GET', f"/toggle_mastery/{record_id}")
+        self.iteration += 1
+
+
+# ========================
+# 集計
+# ========================
+def percentile(sorted_values, q):
+    """最近順位法によるパーセンタイル"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, elapsed, errors):
+    routes = {}
+    total = 0
+    for route, values in latencies.items():
+        values = sorted(values)
+        if not values:
+            continue
+        if route != '/login':
+            total += len(values)
+        routes[route] = {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+            'throughput_rps': round(len(values) / elapsed, 1) if route != '/login' else None,
+        }
+    return {
+        'requests': total,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1),
+        'routes': routes,
+    }
+
+
+def merge_latencies(sessions):
+    merged = {route: [] for route in ROUTES}
+    for latencies in sessions:
+        for route, values in latencies.items():
+            merged[route].extend(values)
+    return merged
+
+
+# ========================
+# テストクライアント
+# ========================
+def run_test_client(app, users, sessions, iterations, seed=0):
+    rng = random.Random(seed)
+    transport = TestClientTransport(app)
+    load_sessions = [LoadSession(transport, user, rng) for user in rng.sample(users, min(sessions, len(users)))]
+    for session in load_sessions:
+        session.login()
+
+    # ログインは計測時間に含めない（pbkdf2が支配的になるため別に集計する）
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for session in load_sessions:
+            session.run_iteration()
+    elapsed = time.perf_counter() - start
+    return summarize(merge_latencies(s.latencies for s in load_sessions), elapsed,
+                     sum(s.errors for s in load_sessions))
+
+
+def test_client_app(args, sqlite_path, n_records):
+    """計測対象のアプリを作成（memory のときはデータをメモリ内に作り直す）"""
+    config = {'SEED_DATA': False, 'LOG_LEVEL': 'WARNING'}
+    if args.store == 'memory':
+        app = create_app({**config, 'DATA_STORE': 'memory'})
+        with app.app_context():
+            users = generate_dataset(get_data_store(), n_records, args.records_per_user)
+        return app, users
+    return create_app({**config, 'DATA_STORE': 'sqlite', 'SQLITE_PATH': sqlite_path}), None
+
+
+# ========================
+# gunicorn
+# ========================
+def wait_until_ready(port, server, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('gunicornが終了しました')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/login')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicornが起動しませんでした')
+
+
+def gunicorn_client(client_id, port, user, duration, seed):
+    """1クライアント分の負荷（ログインしてから一定時間リクエストを送り続ける）"""
+    session = LoadSession(HttpTransport('127.0.0.1', port), user, random.Random(seed + client_id))
+    session.login()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        session.run_iteration()
+    return session.latencies, session.errors
+
+
+def run_gunicorn(sqlite_path, users, workers, clients, duration, port, seed=0):
+    env = dict(os.environ,
+               WEB_CONCURRENCY=str(workers),
+               STUDY_APP_BIND=f"127.0.0.1:{port}",
+               STUDY_APP_SQLITE_PATH=sqlite_path,
+               STUDY_APP_LOG_LEVEL='WARNING')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, server)
+        rng = random.Random(seed)
+        chosen = [rng.choice(users) for _ in range(clients)]
+        with ProcessPoolExecutor(clients) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(gunicorn_client, range(clients), [port] * clients, chosen,
+                                    [duration] * clients, [seed] * clients))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    # 経過時間にはログインも含まれるので、スループットは計測時間（duration）で割る
+    summary = summarize(merge_latencies(latencies for latencies, _ in results), min(elapsed, duration),
+                        sum(errors for _, errors in results))
+    summary.update({'workers': workers, 'clients': clients})
+    return summary
+
+
+# ========================
+# メイン
+# ========================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[1_000, 10_000, 100_000, 1_000_000],
+                        help='記録数（複数指定可）')
+    parser.add_argument('--records-per-user', type=int, default=1_000)
+    parser.add_argument('--targets', default='test_client,gunicorn', help='test_client, gunicorn（カンマ区切り）')
+    parser.add_argument('--store', choices=('sqlite', 'memory'), default='sqlite',
+                        help='テストクライアントで使うデータストア')
+    parser.add_argument('--sessions', type=int, default=10, help='テストクライアントでログインするユーザー数')
+    parser.add_argument('--iterations', type=int, default=50, help='テストクライアントの1ユーザーあたりの周回数')
+    parser.add_argument('--workers', type=int, default=4, help='gunicornのワーカー数')
+    parser.add_argument('--clients', type=int, default=8, help='gunicornに負荷をかけるクライアントプロセス数')
+    parser.add_argument('--duration', type=float, default=10.0, help='gunicornへの負荷の継続時間（秒）')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--data-dir', help='合成データの保存先（指定すると再利用する）')
+    parser.add_argument('--output', help='結果のJSONの出力先（省略時は標準出力）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    targets = [target.strip() for target in args.targets.split(',') if target.strip()]
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'data_dir')},
+        'results': [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        data_dir = args.data_dir or tmpdir
+        os.makedirs(data_dir, exist_ok=True)
+        for n_records in args.sizes:
+            log(f"[{n_records:,} records] データ作成中...")
+            sqlite_path, users, generate_seconds = prepare_sqlite_dataset(data_dir, n_records, args.records_per_user)
+            result = {
+                'records': n_records,
+                'users': len(users),
+                'generate_seconds': round(generate_seconds, 3),
+                'targets': {},
+            }
+
+            if 'test_client' in targets:
+                log(f"[{n_records:,} records] test_client ({args.store})")
+                app, memory_users = test_client_app(args, sqlite_path, n_records)
+                result['targets']['test_client'] = run_test_client(app, memory_users or users,
+                                                                   args.sessions, args.iterations)
+                result['targets']['test_client']['store'] = args.store
+                if args.store == 'sqlite':
+                    with app.app_context():
+                        get_data_store().close()
+                del app
+
+            if 'gunicorn' in targets:
+                log(f"[{n_records:,} records] gunicorn ({args.workers} workers, {args.clients} clients)")
+                result['targets']['gunicorn'] = run_gunicorn(sqlite_path, users, args.workers, args.clients,
+                                                             args.duration, args.port)
+            report['results'].append(result)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""gunicornのワーカー数ごとのスループット計測
+
+ワーカー数を 1, 2, 4 ... と変えてgunicornを起動し、複数のクライアント
+プロセスからログイン後に /dashboard・/records・/add_record を叩き続けて、
+1秒あたりの処理件数を比較する。全ワーカーは同じSQLiteファイルを共有する。
+
+実行: python benchmarks/load_test_workers.py [ワーカー数 ...]
+"""
+import http.cookiejar
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}"
+DURATION = 10  # 秒
+CLIENTS = 8
+
+
+def wait_until_ready(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{BASE_URL}/login", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicornが起動しませんでした')
+
+
+def client(client_id):
+    """1クライアント分の負荷（ログインしてから一定時間リクエストを送り続ける）"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    login = urllib.parse.urlencode({'username': f'load{client_id}', 'password': 'password'}).encode()
+    opener.open(f"{BASE_URL}/login", login)
+    
+    add_record = urllib.parse.urlencode({
+        'study_subject': '数学', 'study_content': '負荷試験', 'study_time_minutes': 30,
+    }).encode()
+    
+    count = 0
+    deadline = time.time() + DURATION
+    while time.time() < deadline:
+        step = count % 3
+        if step == 0:
+            opener.open(f"{BASE_URL}/dashboard").read()
+        elif step == 1:
+            opener.open(f"{BASE_URL}/records").read()
+        else:
+            opener.open(f"{BASE_URL}/add_record", add_record).read()
+        count += 1
+    return count
+
+
+def run(workers):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = dict(os.environ,
+                   WEB_CONCURRENCY=str(workers),
+                   STUDY_APP_BIND=f"127.0.0.1:{PORT}",
+                   STUDY_APP_SQLITE_PATH=os.path.join(tmpdir, 'load.db'))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready()
+            with ProcessPoolExecutor(CLIENTS) as pool:
+                total = sum(pool.map(client, range(CLIENTS)))
+        finally:
+            server.terminate()
+            server.wait()
+    return total / DURATION
+
+
+if __name__ == '__main__':
+    worker_counts = [int(n) for n in sys.argv[1:]] or [1, 2, 4]
+    print(f"{'workers':>8} {'req/s':>10}")
+    for workers in worker_counts:
+        print(f"{workers:>8} {run(workers):>10.1f}")
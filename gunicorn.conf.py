@@ -0,0 +1,18 @@
+# gunicorn設定（複数ワーカー構成）
+#
+# メモリ内ストアはワーカーごとに別々のデータを持ってしまうため、
+# 複数ワーカーで動かす場合は全ワーカーで共有するSQLiteファイルを使う。
+#
+# 起動: gunicorn -c gunicorn.conf.py
+import multiprocessing
+import os
+
+wsgi_app = 'app_render:create_app()'
+bind = os.environ.get('STUDY_APP_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# 各ワーカーはアプリ読み込み前にこの環境変数を受け取る
+raw_env = [
+    'STUDY_APP_DATA_STORE=sqlite',
+    f"STUDY_APP_SQLITE_PATH={os.environ.get('STUDY_APP_SQLITE_PATH', 'study_app.db')}",
+]